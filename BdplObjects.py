@@ -4,14 +4,19 @@ import bagit
 import chardet
 from collections import OrderedDict
 from collections import Counter
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 import csv
 import datetime
 import errno
 import fnmatch
 import glob
 import hashlib
+import itertools
+import json
 from lxml import etree
 import math
+import mmap
 import openpyxl
 import os
 import pickle
@@ -23,6 +28,8 @@ import sqlite3
 import subprocess
 import sys
 import tarfile
+import tempfile
+import threading
 import time
 import tkinter as tk
 from tkinter import ttk
@@ -32,11 +39,1008 @@ from urllib.parse import unquote
 import urllib.request
 import uuid
 import webbrowser
+import xml.parsers.expat
 import zipfile
 
 # from dfxml project
+import dfxml
 import Objects
 
+class ChecksumEngine:
+    '''
+    Calculate file checksums with a bounded pool of worker threads.  hashlib releases the GIL while digesting, so threads let us overlap disk/network reads with hashing.  Each worker reuses a single large read buffer instead of allocating a new bytes object for every chunk, and every requested digest is calculated from that one read of the file.  Files at or above mmap_threshold (if one is set) are instead memory-mapped and hashed in place, without copying data into Python at all.  This is off by default: on Windows, a read error on a mapped view (a network share dropping, a failing disk) kills the interpreter instead of raising an exception, so only turn it on for local fixed disks.
+    '''
+    def __init__(self, workers=None, buffer_size=4194304, algorithms=('md5',), mmap_threshold=None):
+        #network shares reward a few extra threads; keep the pool bounded so we don't swamp the source
+        self.workers = workers or min(16, (os.cpu_count() or 1) * 2)
+        self.buffer_size = buffer_size
+        self.algorithms = tuple(algorithms)
+        self.mmap_threshold = mmap_threshold
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.files_done = 0
+        self.bytes_done = 0
+        self.start_time = time.time()
+
+    def _get_buffer(self):
+        #each thread gets its own reusable buffer
+        if not hasattr(self._local, 'view'):
+            self._local.view = memoryview(bytearray(self.buffer_size))
+        return self._local.view
+
+    def digest_file(self, fname, progress=False):
+        '''
+        Returns a dictionary of {algorithm : hexdigest} and the number of bytes read.  Files are read into our preallocated buffer, or memory-mapped if they are at or above mmap_threshold.  Set progress to print running throughput for a single large file.
+        '''
+        hashers = [hashlib.new(alg) for alg in self.algorithms]
+        size = os.path.getsize(fname)
+        hashers, total = self._digest(fname, hashers, size, progress)
+
+        with self._lock:
+            self.files_done += 1
+            self.bytes_done += total
+
+        return ({alg : h.hexdigest() for alg, h in zip(self.algorithms, hashers)}, total)
+
+    def _digest(self, fname, hashers, size, progress):
+        #returns the hashers (new ones if we had to start over) and the number of bytes read
+        if self.mmap_threshold is not None and size >= self.mmap_threshold and size > 0:
+            try:
+                return (hashers, self._digest_mmap(fname, hashers, size, progress))
+            except (OSError, ValueError):
+                #some file systems (and 32-bit Python) can't map the file; fall back on buffered reads
+                hashers = [hashlib.new(alg) for alg in self.algorithms]
+        return (hashers, self._digest_readinto(fname, hashers, size, progress))
+
+    def _digest_readinto(self, fname, hashers, size, progress):
+        view = self._get_buffer()
+        total = 0
+        report = self._progress_reporter(fname, size) if progress else None
+        with open(fname, 'rb', buffering=0) as f:
+            while True:
+                n = f.readinto(view)
+                if not n:
+                    break
+                chunk = view[:n]
+                for h in hashers:
+                    h.update(chunk)
+                total += n
+                if report:
+                    report(total)
+        if report:
+            report(total, True)
+        return total
+
+    def _digest_mmap(self, fname, hashers, size, progress):
+        #hash slices of the mapped file; slices are kept small enough that each one is still in cache for the second and third digests
+        step = 1048576
+        total = 0
+        report = self._progress_reporter(fname, size) if progress else None
+        with open(fname, 'rb') as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                if hasattr(mm, 'madvise') and hasattr(mmap, 'MADV_SEQUENTIAL'):
+                    mm.madvise(mmap.MADV_SEQUENTIAL)
+                view = memoryview(mm)
+                try:
+                    for offset in range(0, len(mm), step):
+                        chunk = view[offset:offset + step]
+                        for h in hashers:
+                            h.update(chunk)
+                        chunk.release()
+                        total += min(step, len(mm) - offset)
+                        if report:
+                            report(total)
+                finally:
+                    view.release()
+        if report:
+            report(total, True)
+        return total
+
+    def _progress_reporter(self, fname, size):
+        #returns a function that prints progress and throughput at most once per second
+        start = time.time()
+        state = {'last' : start}
+        
+        def report(done, final=False):
+            now = time.time()
+            if not final and now - state['last'] < 1:
+                return
+            state['last'] = now
+            mb_per_sec = done / 1048576 / max(now - start, 0.001)
+            print('\r\tCalculating checksums for {}: {:.0f} of {:.0f} MB ({:.1f} MB/s)'.format(os.path.basename(fname), done / 1048576, size / 1048576, mb_per_sec), end='')
+            if final:
+                print()
+        
+        return report
+
+    def imap(self, func, items):
+        '''
+        Apply func to each item using the thread pool and yield results in the same order as items.  No more than a few jobs per worker are queued at once, so memory stays bounded no matter how many items we have.
+        '''
+        window = self.workers * 4
+        pending = deque()
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            for item in items:
+                pending.append(executor.submit(func, item))
+                if len(pending) >= window:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+
+    def rate(self):
+        #return throughput as (files per second, MB per second)
+        elapsed = max(time.time() - self.start_time, 0.001)
+        return (self.files_done / elapsed, self.bytes_done / 1048576 / elapsed)
+
+class HashingWriter:
+    '''
+    Minimal writable file object that passes everything written to it on to a real file while updating digests and a byte count.  Handing one of these to tarfile lets us get a SIP's checksums and size while the tar is being written, instead of reading it back afterwards.
+    '''
+    def __init__(self, fname, algorithms=('md5',), buffer_size=4194304):
+        self.name = fname
+        self.algorithms = tuple(algorithms)
+        self.hashers = [hashlib.new(alg) for alg in self.algorithms]
+        self.size = 0
+        self._file = open(fname, 'wb', buffering=buffer_size)
+
+    def write(self, data):
+        for h in self.hashers:
+            h.update(data)
+        self._file.write(data)
+        self.size += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.size
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+    def digests(self):
+        return {alg : h.hexdigest() for alg, h in zip(self.algorithms, self.hashers)}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
+        return False
+
+class TeeReader:
+    '''
+    Minimal readable file object that passes along whatever is read from a stream (e.g., a subprocess's output) and saves a copy of it to a file.  Handing one of these to a parser lets us parse a tool's output as it is produced and keep the output on disk at the same time.
+    '''
+    def __init__(self, stream, fname, buffer_size=4194304):
+        self.stream = stream
+        self.name = fname
+        self._file = open(fname, 'wb', buffering=buffer_size)
+
+    def read(self, size=-1):
+        data = self.stream.read(size)
+        if data:
+            self._file.write(data)
+        return data
+
+    def readline(self, size=-1):
+        line = self.stream.readline(size)
+        if line:
+            self._file.write(line)
+        return line
+
+    def __iter__(self):
+        return iter(self.readline, b'')
+
+    def drain(self, chunk_size=1048576):
+        #copy anything the parser didn't get to (e.g., after a parse error) so the saved file is complete
+        while self.read(chunk_size):
+            pass
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
+        return False
+
+class CopyEngine(ChecksumEngine):
+    '''
+    Copy files and calculate checksums in the same pass: every buffer read from the source is written to the destination and fed to the hash functions, so the source is only read once.  Each copy is then verified by hashing the destination.  Small files are copied in parallel; large files are copied one at a time so they don't compete for the same disk.  Timestamps are carried over to the copies once they have been verified; a copy that fails verification is removed.  If a digest_store is given, a destination is only skipped when the store has digests for it (i.e., it was copied and verified on an earlier run) and it still matches them and the source's size and modification time.
+    '''
+    log_header = ['Source', 'Offset', 'State', 'Size', 'Attributes', 'IsFolder', 'Creation', 'Access', 'Write', 'SourceCRC', 'TargetCRC', 'TargetName', 'Message', 'Marked', 'Hidden']
+    
+    def __init__(self, workers=None, buffer_size=8388608, algorithms=('md5',), large_file_threshold=67108864, digest_store=None):
+        ChecksumEngine.__init__(self, workers=workers, buffer_size=buffer_size, algorithms=algorithms)
+        self.large_file_threshold = large_file_threshold
+        self.digest_store = digest_store
+        self.copied = 0
+        self.skipped = 0
+        self.failed = 0
+
+    def copy_file(self, job):
+        '''
+        Copy a single (source, destination, source_stat) job; returns the job along with the source digests and a log row.  A destination with recorded digests that still matches the source's size and modification time is skipped (and not re-read).
+        '''
+        src, dst, st = job
+        digests = {}
+        state = 'Copied'
+        message = ''
+        target_crc = ''
+        created = False
+        
+        try:
+            recorded = self.verified_copy(dst, st)
+            if recorded:
+                state = 'Skipped'
+                total = 0
+                digests = recorded
+                target_crc = digests[self.algorithms[0]]
+            else:
+                hashers = [hashlib.new(alg) for alg in self.algorithms]
+                view = self._get_buffer()
+                total = 0
+                with open(src, 'rb', buffering=0) as f_in, open(dst, 'wb', buffering=0) as f_out:
+                    created = True
+                    while True:
+                        n = f_in.readinto(view)
+                        if not n:
+                            break
+                        chunk = view[:n]
+                        for h in hashers:
+                            h.update(chunk)
+                        
+                        #unbuffered writes may be partial
+                        written = 0
+                        while written < n:
+                            written += f_out.write(chunk[written:])
+                        total += n
+                
+                digests = {alg : h.hexdigest() for alg, h in zip(self.algorithms, hashers)}
+                
+                #verify the copy by reading it back
+                dst_hashers = [hashlib.new(alg) for alg in self.algorithms]
+                dst_hashers, dst_size = self._digest(dst, dst_hashers, total, False)
+                dst_digests = {alg : h.hexdigest() for alg, h in zip(self.algorithms, dst_hashers)}
+                target_crc = dst_digests[self.algorithms[0]]
+                if dst_digests != digests or dst_size != st.st_size:
+                    state = 'Failed'
+                    message = 'Checksum mismatch between source and destination'
+                else:
+                    #only a verified copy gets the source's timestamps
+                    shutil.copystat(src, dst)
+        
+        except OSError as e:
+            state = 'Failed'
+            message = str(e)
+            total = 0
+        
+        #don't leave a bad copy behind
+        if state == 'Failed' and created:
+            try:
+                os.remove(dst)
+            except OSError:
+                pass
+        
+        with self._lock:
+            self.files_done += 1
+            self.bytes_done += total
+            if state == 'Copied':
+                self.copied += 1
+            elif state == 'Skipped':
+                self.skipped += 1
+            else:
+                self.failed += 1
+        
+        attributes = getattr(st, 'st_file_attributes', '')
+        
+        #0x2 is FILE_ATTRIBUTE_HIDDEN
+        hidden = 1 if attributes and attributes & 2 else 0
+        row = [src, total, state, st.st_size, attributes, 0, self.format_time(st.st_ctime), self.format_time(st.st_atime), self.format_time(st.st_mtime), digests.get(self.algorithms[0], ''), target_crc, dst, message, 0, hidden]
+        
+        return (job, digests, row)
+
+    def verified_copy(self, dst, st):
+        #return the recorded digests for dst if it is a verified copy of a source with stat st; otherwise None
+        if self.digest_store is None or not os.path.exists(dst):
+            return None
+        dst_st = os.stat(dst)
+        if dst_st.st_size != st.st_size or int(dst_st.st_mtime) != int(st.st_mtime):
+            return None
+        return self.digest_store.lookup(dst, dst_st)
+
+    def format_time(self, timestamp):
+        return datetime.datetime.fromtimestamp(timestamp).isoformat()
+
+    def copy(self, jobs, log_writer=None, callback=None):
+        '''
+        Copy a list of (source, destination, source_stat) jobs.  Log rows are written to log_writer (a csv.writer) and callback, if given, is called with each (job, digests, row) result as soon as it is available.
+        '''
+        small = [job for job in jobs if job[2].st_size < self.large_file_threshold]
+        large = [job for job in jobs if job[2].st_size >= self.large_file_threshold]
+        
+        def results():
+            for result in self.imap(self.copy_file, small):
+                yield result
+            for job in large:
+                yield self.copy_file(job)
+        
+        for result in results():
+            if log_writer:
+                log_writer.writerow(result[2])
+            if callback:
+                callback(result)
+
+class DigestStore:
+    '''
+    Keep the digests and stat information calculated for an item's files in a sqlite database so that later stages (re-analysis, bagging, SIP creation) can reuse them instead of reading content again.  The database lives in item_ingest_info, so it survives removal of the item's temp folder.  Entries are keyed on the path relative to the barcode folder and are only reused while the file's fingerprint--size, modification time (ns), and inode/file ID--still matches.
+    '''
+    supported_algorithms = ('md5', 'sha1', 'sha256')
+    columns = ['path', 'size', 'mtime_ns', 'file_id', 'mtime', 'ctime', 'atime', 'md5', 'sha1', 'sha256']
+
+    def __init__(self, db_path, root_dir, algorithms=('md5',)):
+        self.db_path = db_path
+        self.root_dir = root_dir
+        self.algorithms = tuple(algorithms)
+        self.pending = 0
+        self._local = threading.local()
+        self._readers = []
+        self._readers_lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path)
+        self.conn.text_factory = str
+        
+        #if the table was created by an older version, throw it away; it only holds cached values
+        current = [row[1] for row in self.conn.execute("PRAGMA table_info(digests)")]
+        if current and current != self.columns:
+            self.conn.execute("DROP TABLE digests")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS digests (path text PRIMARY KEY, size integer, mtime_ns integer, file_id integer, mtime text, ctime text, atime text, md5 text, sha1 text, sha256 text)")
+        self.conn.commit()
+        self._local.conn = self.conn
+
+    def _reader(self):
+        #sqlite connections can't be shared across threads, so worker threads get their own (read-only) connection.  We keep track of these so close() can close them; each is still only used by the thread that opened it
+        if not hasattr(self._local, 'conn'):
+            conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            conn.text_factory = str
+            with self._readers_lock:
+                self._readers.append(conn)
+            self._local.conn = conn
+        return self._local.conn
+
+    def key(self, path):
+        #use forward slashes so keys match bag manifest paths
+        return os.path.relpath(path, self.root_dir).replace('\\', '/')
+
+    def lookup(self, path, st=None):
+        #return stored digests for path, or None if we don't have them or the file's fingerprint no longer matches.  Safe to call from worker threads.
+        if st is None:
+            st = os.stat(path)
+        rows = self._reader().execute("SELECT size, mtime_ns, file_id, md5, sha1, sha256 FROM digests WHERE path=?", (self.key(path),)).fetchall()
+        row = rows[0] if rows else None
+        if row is None or row[0] != st.st_size or row[1] != st.st_mtime_ns or row[2] != st.st_ino:
+            return None
+        digests = dict(zip(self.supported_algorithms, row[3:]))
+        if any(digests[alg] is None for alg in self.algorithms):
+            return None
+        return digests
+
+    def record(self, path, st, digests, times=(None, None, None)):
+        #times is an optional (mtime, ctime, atime) tuple of the ISO strings used in our DFXML
+        self.conn.execute("INSERT OR REPLACE INTO digests VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", (self.key(path), st.st_size, st.st_mtime_ns, st.st_ino, times[0], times[1], times[2], digests.get('md5'), digests.get('sha1'), digests.get('sha256')))
+        self.pending += 1
+        if self.pending >= 1000:
+            self.commit()
+
+    def records(self, folder):
+        #yield file_stats-style dictionaries for all files recorded under folder (used by get_stats)
+        prefix = self.key(folder) + '/'
+        for row in self.conn.execute("SELECT path, size, mtime, ctime, atime, md5 FROM digests WHERE substr(path, 1, ?) = ? AND mtime IS NOT NULL ORDER BY rowid", (len(prefix), prefix)):
+            yield {'name' : os.path.normpath(os.path.join(self.root_dir, row[0])), 'size' : row[1], 'mtime' : row[2], 'ctime' : row[3], 'atime' : row[4], 'checksum' : row[5]}
+
+    def prune(self, folder, seen):
+        #remove entries for files under folder that no longer exist; seen is a set of paths found in the most recent pass
+        prefix = self.key(folder) + '/'
+        stale = [row[0] for row in self.conn.execute("SELECT path FROM digests WHERE substr(path, 1, ?) = ?", (len(prefix), prefix)) if os.path.normpath(os.path.join(self.root_dir, row[0])) not in seen]
+        self.conn.executemany("DELETE FROM digests WHERE path=?", [(p,) for p in stale])
+        self.commit()
+
+    def rekey(self, old_path, new_path):
+        #update keys after a file or folder has been moved within the barcode folder (i.e., into a bag's 'data' directory)
+        old_key = self.key(old_path)
+        new_key = self.key(new_path)
+        self.conn.execute("UPDATE digests SET path = ? || substr(path, ?) WHERE path = ? OR substr(path, 1, ?) = ?", (new_key, len(old_key) + 1, old_key, len(old_key) + 1, old_key + '/'))
+        self.commit()
+
+    def commit(self):
+        self.conn.commit()
+        self.pending = 0
+
+    def close(self):
+        #call once worker threads are finished with the store
+        self.commit()
+        self.conn.close()
+        with self._readers_lock:
+            for conn in self._readers:
+                conn.close()
+            self._readers = []
+
+class DfxmlIndex:
+    '''
+    Per-file facts from an item's fiwalk DFXML (path, size, md5, mtime, crtime, allocation status, inode), kept in a sqlite table next to the digest store so that later stages (fix_dates, get_stats) can query them instead of parsing the XML again.  Paths are as recorded in the DFXML, relative to the root of the file system.  The index notes the size and modification time of the DFXML it was built from; if these no longer match, the index is out of date.
+    '''
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._batch = []
+        self.conn = sqlite3.connect(db_path)
+        self.conn.text_factory = str
+        self.conn.execute("CREATE TABLE IF NOT EXISTS dfxml_files (path text, name_type text, size integer, alloc integer, inode integer, mtime text, crtime text, md5 text)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS dfxml_files_path ON dfxml_files (path)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS dfxml_files_md5 ON dfxml_files (md5)")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS dfxml_source (dfxml text, size integer, mtime_ns integer)")
+        self.conn.commit()
+
+    def is_current(self, dfxml):
+        if not os.path.exists(dfxml):
+            return False
+        st = os.stat(dfxml)
+        return self.conn.execute("SELECT COUNT(*) FROM dfxml_source WHERE dfxml=? AND size=? AND mtime_ns=?", (dfxml, st.st_size, st.st_mtime_ns)).fetchone()[0] > 0
+
+    def clear(self):
+        self._batch = []
+        self.conn.execute("DELETE FROM dfxml_files")
+        self.conn.execute("DELETE FROM dfxml_source")
+        self.conn.commit()
+
+    def add(self, path, name_type=None, size=None, alloc=True, inode=None, mtime=None, crtime=None, md5=None):
+        #values are the text found in the DFXML
+        self._batch.append((path, name_type, int(size) if size else None, 1 if alloc else 0, int(inode) if inode else None, mtime, crtime, md5))
+        if len(self._batch) >= 1000:
+            self.flush()
+
+    def flush(self):
+        self.conn.executemany("INSERT INTO dfxml_files VALUES (?, ?, ?, ?, ?, ?, ?, ?)", self._batch)
+        self.conn.commit()
+        self._batch = []
+
+    def finish(self, dfxml):
+        #note which DFXML file the index now reflects
+        self.flush()
+        st = os.stat(dfxml)
+        self.conn.execute("DELETE FROM dfxml_source")
+        self.conn.execute("INSERT INTO dfxml_source VALUES (?, ?, ?)", (dfxml, st.st_size, st.st_mtime_ns))
+        self.conn.commit()
+
+    def build(self, dfxml):
+        #(re)build the index from an existing DFXML file, e.g. one created before we kept an index
+        self.clear()
+        fields = ('filename', 'name_type', 'filesize', 'alloc', 'unalloc', 'inode', 'mtime', 'crtime', 'md5')
+        try:
+            for r in Objects.iterrecords(dfxml, fields):
+                self.add(r.filename, r.name_type, r.filesize, r.alloc in (None, '1') and r.unalloc != '1', r.inode, r.mtime, r.crtime, r.md5)
+        except etree.XMLSyntaxError:
+            print('\n\tUnable to read DFXML!')
+        self.finish(dfxml)
+
+    @staticmethod
+    def iso_time(value):
+        #fiwalk may report times as seconds since the epoch (UTC); return ISO 8601 to the second
+        if not value:
+            return None
+        if value[4:5] != '-':
+            return datetime.datetime.utcfromtimestamp(int(float(value))).isoformat()
+        return value[:19]
+
+    def lookup(self, path):
+        row = self.conn.execute("SELECT path, name_type, size, alloc, inode, mtime, crtime, md5 FROM dfxml_files WHERE path=? ORDER BY rowid DESC LIMIT 1", (path,)).fetchone()
+        if row is None:
+            return None
+        return dict(zip(['path', 'name_type', 'size', 'alloc', 'inode', 'mtime', 'crtime', 'md5'], row))
+
+    def paths_by_digest(self, md5):
+        return [row[0] for row in self.conn.execute("SELECT path FROM dfxml_files WHERE md5=? ORDER BY rowid", (md5,))]
+
+    def dates(self):
+        #yield (path, mtime, crtime) for regular files and directories, in DFXML order (used by fix_dates)
+        for row in self.conn.execute("SELECT path, mtime, crtime FROM dfxml_files WHERE name_type IS NULL OR name_type IN ('r', 'd') ORDER BY rowid"):
+            yield row
+
+    def file_stats(self):
+        #yield file_stats-style dictionaries for allocated regular files (used by get_stats)
+        for path, size, mtime, crtime, md5 in self.conn.execute("SELECT path, size, mtime, crtime, md5 FROM dfxml_files WHERE (name_type IS NULL OR name_type = 'r') AND alloc = 1 ORDER BY rowid"):
+            yield {'name' : path or '', 'size' : size if size is not None else '', 'mtime' : self.iso_time(mtime or crtime) or 'undated', 'checksum' : md5 or ''}
+
+    def close(self):
+        if self._batch:
+            self.flush()
+        self.conn.close()
+
+class SiegfriedStats:
+    '''
+    Tally siegfried results for get_stats without a separate query (or pass over the results) for each report.  Results are added as counts of files that share a format, version, ID, and MIME type (add_group()) plus the rows of files that are unidentified or have errors (list_row(), in the column order of siegfried.csv).  The counts behind every report are kept in memory and unidentified files and files with errors are written straight to their reports; close() then writes the format, version, and MIME type reports.  Groups are listed by count, largest first; ties stay in the order they were first seen.  If files with the same format have different IDs, the format is listed with its most common ID.
+    '''
+    full_header = ['Filename', 'Filesize', 'Date modified', 'Errors', 'Namespace', 'ID', 'Format', 'Format version', 'MIME type', 'Basis for ID', 'Warning']
+    
+    def __init__(self, reports_dir):
+        self.reports_dir = reports_dir
+        self.num_files = 0
+        self.empty_files = 0
+        self.unidentified_files = 0
+        self.num_errors = 0
+        
+        #format -> Counter of IDs; (format, version) -> Counter of IDs; mime -> count
+        self.formats = {}
+        self.versions = {}
+        self.mimetypes = {}
+        
+        self._files = []
+        self._unidentified = self._open_report('unidentified.csv', self.full_header)
+        self._errors = self._open_report('errors.csv', self.full_header)
+    
+    def _open_report(self, name, header):
+        f = open(os.path.join(self.reports_dir, name), 'w', newline='', encoding='utf8')
+        self._files.append(f)
+        writer = csv.writer(f, lineterminator='\n')
+        writer.writerow(header)
+        return writer
+    
+    def add_group(self, fmt, version, fmt_id, mime, count, empty, errors):
+        #count files share a format, version, ID, and MIME type; empty of them are empty and errors have siegfried errors
+        self.num_files += count
+        self.empty_files += empty
+        self.num_errors += errors
+        if fmt_id == 'UNKNOWN':
+            self.unidentified_files += count
+        
+        self.formats.setdefault(fmt, Counter())[fmt_id] += count
+        self.versions.setdefault((fmt, version), Counter())[fmt_id] += count
+        self.mimetypes[mime] = self.mimetypes.get(mime, 0) + count
+    
+    def list_row(self, row):
+        #add a file to the unidentified and errors reports, if it belongs there
+        if row[5] == 'UNKNOWN':
+            self._unidentified.writerow(row)
+        if row[3] != '':
+            self._errors.writerow(row)
+    
+    def num_formats(self):
+        #number of identified formats
+        return len([fmt for fmt in self.formats if fmt != ''])
+    
+    def format_overview(self):
+        fileformats = [fmt or 'Unidentified' for fmt, fmt_id, count in self.format_rows()] # replace empty elements with 'Unidentified'
+        if fileformats:
+            return "Top file formats (out of {} total) are: {}".format(len(fileformats), ' | '.join(fileformats[:10]))
+        else:
+            return "-"
+    
+    def _by_count(self, groups):
+        #return (key, most common ID, count) for groups of IDs, largest first
+        totals = [(key, ids.most_common(1)[0][0], sum(ids.values())) for key, ids in groups.items()]
+        return sorted(totals, key=lambda total: total[2], reverse=True)
+    
+    def format_rows(self):
+        return [[fmt, fmt_id, count] for fmt, fmt_id, count in self._by_count(self.formats)]
+    
+    def version_rows(self):
+        return [[fmt, fmt_id, version, count] for (fmt, version), fmt_id, count in self._by_count(self.versions)]
+    
+    def mimetype_rows(self):
+        return [[mime, count] for mime, count in sorted(self.mimetypes.items(), key=lambda item: item[1], reverse=True)]
+    
+    def close(self):
+        #write the grouped reports and close everything
+        self._open_report('formats.csv', ['Format', 'ID', 'Count']).writerows(self.format_rows())
+        self._open_report('formatVersions.csv', ['Format', 'ID', 'Version', 'Count']).writerows(self.version_rows())
+        self._open_report('mimetypes.csv', ['MIME type', 'Count']).writerows(self.mimetype_rows())
+        for f in self._files:
+            f.close()
+        self._files = []
+
+class HtmlReport:
+    '''
+    Buffered, atomic writer for report.html.  Text is collected in memory and written out in large chunks; PRONOM IDs are turned into links as each chunk goes out, so the report doesn't need a second pass.  The report is built in a temporary file next to its destination and only moved into place once it's complete.  The page's fixed markup and the markup for table rows are templates prepared once, when the class is defined.
+    '''
+    pronom_regex = re.compile(r"fmt\/[0-9]+|x\-fmt\/[0-9]+") #regex to match fmt/# or x-fmt/#
+    pronom_link = r'<a href="http://nationalarchives.gov.uk/PRONOM/\g<0>" target="_blank">\g<0></a>'
+    
+    nav_links = [('Provenance', 'Provenance'), ('Stats', 'Statistics'), ('File formats', 'File formats'), ('File format versions', 'Versions'), ('MIME types', 'MIME types'), ('Last modified dates by year', 'Dates'), ('Unidentified', 'Unidentified'), ('Errors', 'Errors'), ('Duplicates', 'Duplicates'), ('Personally Identifiable Information (PII)', 'PII'), ('Named Entities', 'Named Entities')]
+    
+    page_header = ''.join(['<!DOCTYPE html>', 
+        '\n<html lang="en">', 
+        '\n<head>', 
+        '\n<title>IUL Born Digital Preservation Lab report: {identifier}</title>', 
+        '\n<meta http-equiv="Content-Type" content="text/html; charset=utf-8">', 
+        '\n<meta name="description" content="HTML report based upon a template developed by Tim Walsh and distributed as part of Brunnhilde v. 1.7.2">', 
+        '\n<link rel="stylesheet" href="./assets//css/bootstrap.min.css">', 
+        '\n</head>', 
+        '\n<body style="padding-top: 80px">', 
+        '\n<nav class="navbar navbar-expand-lg navbar-dark bg-dark fixed-top">', 
+        '\n<a class="navbar-brand" href="#">Brunnhilde</a>', 
+        '\n<button class="navbar-toggler" type="button" data-toggle="collapse" data-target="#navbarNavAltMarkup" aria-controls="navbarNavAltMarkup" aria-expanded="false" aria-label="Toggle navigation">', 
+        '\n<span class="navbar-toggler-icon"></span>', 
+        '\n</button>', 
+        '\n<div class="collapse navbar-collapse" id="navbarNavAltMarkup">', 
+        '\n<div class="navbar-nav">'] + 
+        ['\n<a class="nav-item nav-link" href="#{}">{}</a>'.format(anchor, label) for anchor, label in nav_links] + 
+        ['\n</div>', 
+        '\n</div>', 
+        '\n</nav>', 
+        '\n<div class="container-fluid">', 
+        '\n<h1 style="text-align: center; margin-bottom: 40px;">IUL BDPL Brunnhilde HTML report</h1>'])
+    
+    page_footer = ''.join(['\n</div>', 
+        '\n</div>', 
+        '\n</div>', 
+        '\n</div>', 
+        '\n<script src="./assets//js/jquery-3.3.1.slim.min.js"></script>', 
+        '\n<script src="./assets//js/popper.min.js"></script>', 
+        '\n<script src="./assets//js/bootstrap.min.js"></script>', 
+        '\n<script>$(".navbar-nav .nav-link").on("click", function(){ $(".navbar-nav").find(".active").removeClass("active"); $(this).addClass("active"); });</script>', 
+        '\n<script>$(".navbar-brand").on("click", function(){ $(".navbar-nav").find(".active").removeClass("active"); });</script>', 
+        '\n</body>', 
+        '\n</html>'])
+    
+    card_header = ''.join(['\n<div class="container-fluid" style="margin-bottom: 40px;">', 
+        '\n<div class="card">', 
+        '\n<h2 class="card-header">{title}</h2>', 
+        '\n<div class="card-body">'])
+    
+    card_footer = '\n</div>\n</div>\n</div>'
+    
+    section_header = '\n<a name="{0}" style="padding-top: 40px;"></a>\n<h4>{0}</h4>'
+    
+    table_header = '\n<table class="table table-sm table-responsive{} table-hover">\n<thead>\n<tr>'
+    table_body = '\n</tr>\n</thead>\n<tbody>'
+    table_footer = '\n</tbody>\n</table>'
+    
+    def __init__(self, path, chunk_size=1048576):
+        self.path = path
+        self.temp_path = path + '.tmp'
+        self.chunk_size = chunk_size
+        self._parts = []
+        self._size = 0
+        self._file = open(self.temp_path, 'w', encoding='utf8', buffering=chunk_size)
+    
+    def write(self, text):
+        self._parts.append(text)
+        self._size += len(text)
+        if self._size >= self.chunk_size:
+            self.flush()
+    
+    def flush(self):
+        #add PRONOM links; IDs never span two writes, so it's safe to do this a chunk at a time
+        self._file.write(self.pronom_regex.sub(self.pronom_link, ''.join(self._parts)))
+        self._parts = []
+        self._size = 0
+    
+    def row(self, columns):
+        return '\n<tr>' + ''.join(['\n<td>{}</td>'.format(column) for column in columns]) + '\n</tr>'
+    
+    def table(self, header, rows, bordered=False):
+        #write a table with a header row (header may be given as a single string of markup) and data rows
+        self.write(self.table_header.format(' table-bordered' if bordered else ''))
+        if isinstance(header, str):
+            self.write(header)
+        else:
+            self.write(''.join(['\n<th>{}</th>'.format(column) for column in header]))
+        self.write(self.table_body)
+        for columns in rows:
+            self.write(self.row(columns))
+        self.write(self.table_footer)
+    
+    def close(self):
+        self.flush()
+        self._file.close()
+        os.replace(self.temp_path, self.path)
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            #leave any earlier report alone
+            self._file.close()
+            os.remove(self.temp_path)
+        return False
+
+class ResumeJournal:
+    '''
+    Append-only log that lets a long-running stage pick up where it left off after a crash.  Each record is a dictionary stored as one line of JSON (so filenames with odd characters are safe); records are written and fsynced in batches rather than one file open per record.  Only the record keys are held in memory (for constant-time membership checks); the records themselves are streamed back from disk.
+    '''
+    def __init__(self, path, key='name', batch_size=500, flush_interval=5, before_flush=None):
+        self.path = path
+        self.key = key
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.before_flush = before_flush
+        self.keys = set()
+        self._batch = []
+        self._last_flush = time.time()
+        self.load()
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        
+        #if we crashed in the middle of a write, trim the partial record so new records start on a fresh line
+        with open(self.path, 'r+b') as f:
+            f.seek(0, os.SEEK_END)
+            end = f.tell()
+            if end > 0:
+                f.seek(end - 1)
+                if f.read(1) != b'\n':
+                    f.seek(0)
+                    last_newline = 0
+                    for line in f:
+                        if line.endswith(b'\n'):
+                            last_newline = f.tell()
+                    f.truncate(last_newline)
+        
+        for record in self.records():
+            self.keys.add(record[self.key])
+
+    def __contains__(self, key):
+        return key in self.keys
+
+    def __len__(self):
+        return len(self.keys)
+
+    def records(self):
+        #stream records back from disk, in the order they were written
+        self.flush()
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+
+    def append(self, record):
+        self.keys.add(record[self.key])
+        self._batch.append(json.dumps(record))
+        if len(self._batch) >= self.batch_size or time.time() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        if self._batch:
+            #let the caller persist anything the journal depends on before we claim these records are done
+            if self.before_flush:
+                self.before_flush()
+            with open(self.path, 'a', encoding='utf-8', newline='\n') as f:
+                f.write('\n'.join(self._batch) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+            self._batch = []
+        self._last_flush = time.time()
+
+    def close(self):
+        self.flush()
+
+    def remove(self):
+        #discard the journal once the stage has completed
+        self._batch = []
+        self.keys.clear()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+class DfxmlWriter:
+    '''
+    Writes a bdpl_ingest DFXML hash list one fileobject at a time, so memory use stays flat no matter how many files an item has.  The header is written when the writer is opened and each call to add() serializes a single fileobject; the result is the same pretty-printed document we previously built in memory with etree.
+    '''
+    dc_namespace = 'http://purl.org/dc/elements/1.1/'
+    NSMAP = {None : 'http://www.forensicswiki.org/wiki/Category:Digital_Forensics_XML',
+            'xsi': "http://www.w3.org/2001/XMLSchema-instance",
+            'dc' : dc_namespace}
+    
+    def __init__(self, path, start_time, program='bdpl_ingest'):
+        self.path = path
+        self.start_time = start_time
+        self.program = program
+        self.count = 0
+
+    def __enter__(self):
+        self._file = open(self.path, 'wb')
+        self._xf_context = etree.xmlfile(self._file, encoding='UTF-8')
+        self._xf = self._xf_context.__enter__()
+        self._xf.write_declaration()
+        self._root = self._xf.element('dfxml', nsmap=self.NSMAP, version='1.0')
+        self._root.__enter__()
+        
+        #write the header with the xmlfile API so that the dc prefix declared on the root element stays in scope
+        self._xf.write('\n  ')
+        with self._xf.element('metadata'):
+            self._xf.write('\n    ')
+            with self._xf.element('{%s}type' % self.dc_namespace):
+                self._xf.write('Hash List')
+            self._xf.write('\n  ')
+        
+        creator = etree.Element('creator')
+        program = etree.SubElement(creator, 'program')
+        program.text = self.program
+        execution_environment = etree.SubElement(creator, 'execution_environment')
+        start_time = etree.SubElement(execution_environment, 'start_time')
+        start_time.text = self.start_time
+        self._write(creator)
+        return self
+
+    def _write(self, element):
+        etree.indent(element, level=1)
+        self._xf.write('\n  ')
+        self._xf.write(element)
+
+    def add(self, f):
+        fileobject = etree.Element('fileobject')
+        filename = etree.SubElement(fileobject, 'filename')
+        filename.text = f['name']
+        filesize = etree.SubElement(fileobject, 'filesize')
+        filesize.text = str(f['size'])
+        modifiedtime = etree.SubElement(fileobject, 'mtime')
+        modifiedtime.text = f['mtime']
+        createdtime = etree.SubElement(fileobject, 'ctime')
+        createdtime.text = f['ctime']
+        accesstime = etree.SubElement(fileobject, 'atime')
+        accesstime.text = f['atime']
+        hashdigest = etree.SubElement(fileobject, 'hashdigest', type='md5')
+        hashdigest.text = f['checksum']
+        self._write(fileobject)
+        self.count += 1
+
+    def __exit__(self, exc_type, exc_value, tb):
+        try:
+            if exc_type is None:
+                self._xf.write('\n')
+            self._root.__exit__(exc_type, exc_value, tb)
+            self._xf_context.__exit__(exc_type, exc_value, tb)
+            if exc_type is None:
+                self._file.write(b'\n')
+        finally:
+            self._file.close()
+        return False
+
+class ItemInventory:
+    '''
+    Cached listing of every file under a folder (path, size, and timestamps), built with os.scandir in a single pass so that later steps don't each have to walk the folder again (expensive on network shares).  refresh() rescans folders whose modification time has changed, which picks up files that have been added, removed, or renamed; files in other folders are re-stat'ed, since a file rewritten in place doesn't change its folder's modification time.  Files are listed in the same order os.walk would return them.
+    '''
+    def __init__(self, root):
+        self.root = os.path.normpath(root)
+        
+        #self.dirs maps each folder to its mtime and the names of its files and subfolders; self.files maps each file path to (size, mtime, ctime, atime, is_link)
+        self.dirs = {}
+        self.files = {}
+        self.scan(self.root)
+
+    def _scan_dir(self, folder):
+        #list a single folder; returns False if it can't be read
+        try:
+            dir_mtime = os.stat(folder).st_mtime_ns
+            entries = list(os.scandir(folder))
+        except OSError:
+            return False
+        
+        if folder in self.dirs:
+            for name in self.dirs[folder]['files']:
+                self.files.pop(os.path.join(folder, name), None)
+        
+        filenames = []
+        subdirs = []
+        for entry in entries:
+            try:
+                is_dir = entry.is_dir()
+            except OSError:
+                is_dir = False
+            if is_dir:
+                subdirs.append(entry.name)
+                continue
+            
+            #on Windows, scandir already has this info, so no extra call to the file server is needed
+            try:
+                st = entry.stat()
+                self.files[entry.path] = (st.st_size, st.st_mtime, st.st_ctime, st.st_atime, entry.is_symlink())
+            except OSError:
+                #broken links: os.walk still lists these, so we will too
+                self.files[entry.path] = (0, None, None, None, True)
+            filenames.append(entry.name)
+        
+        self.dirs[folder] = {'mtime' : dir_mtime, 'files' : filenames, 'subdirs' : subdirs}
+        return True
+
+    def _restat(self, folder):
+        #update the size and timestamps of folder's files; returns False if one of them can no longer be found (and the folder needs to be rescanned)
+        for name in self.dirs[folder]['files']:
+            path = os.path.join(folder, name)
+            is_link = self.files[path][4]
+            try:
+                st = os.stat(path)
+            except OSError:
+                if self.files[path][1] is None:
+                    #still a broken link
+                    continue
+                return False
+            self.files[path] = (st.st_size, st.st_mtime, st.st_ctime, st.st_atime, is_link)
+        return True
+
+    def _subfolders(self, folder):
+        #like os.walk, we don't descend into symlinked folders
+        return [os.path.join(folder, d) for d in self.dirs[folder]['subdirs'] if not os.path.islink(os.path.join(folder, d))]
+
+    def scan(self, folder):
+        #(re)build the listing for folder and everything below it
+        self._drop(folder)
+        pending = [folder]
+        while pending:
+            current = pending.pop()
+            if self._scan_dir(current):
+                pending.extend(self._subfolders(current))
+
+    def _drop(self, folder):
+        #forget folder and everything below it
+        info = self.dirs.pop(folder, None)
+        if info is None:
+            return
+        for name in info['files']:
+            self.files.pop(os.path.join(folder, name), None)
+        for name in info['subdirs']:
+            self._drop(os.path.join(folder, name))
+
+    def refresh(self):
+        #rescan any folder that has had entries added or removed since our last pass; re-stat the files in the rest
+        for folder in list(self.dirs):
+            if not folder in self.dirs:
+                continue
+            try:
+                changed = os.stat(folder).st_mtime_ns != self.dirs[folder]['mtime']
+            except OSError:
+                self._drop(folder)
+                continue
+            if not changed:
+                changed = not self._restat(folder)
+            if changed:
+                old_subdirs = self._subfolders(folder)
+                if not self._scan_dir(folder):
+                    self._drop(folder)
+                    continue
+                new_subdirs = self._subfolders(folder)
+                for path in old_subdirs:
+                    if not path in new_subdirs:
+                        self._drop(path)
+                for path in new_subdirs:
+                    if not path in self.dirs:
+                        self.scan(path)
+        
+        #pick up the root folder if it didn't exist when we started
+        if not self.root in self.dirs and os.path.isdir(self.root):
+            self.scan(self.root)
+
+    def paths(self, folder=None):
+        #yield file paths under folder (default: our root) in os.walk order
+        pending = [os.path.normpath(folder) if folder else self.root]
+        while pending:
+            current = pending.pop()
+            info = self.dirs.get(current)
+            if info is None:
+                continue
+            for name in info['files']:
+                yield os.path.join(current, name)
+            pending.extend(reversed([os.path.join(current, d) for d in info['subdirs']]))
+
+    def count(self, folder=None):
+        return sum(1 for path in self.paths(folder))
+
+    def total_size(self, folder=None, skip_links=False):
+        return sum(self.files[path][0] for path in self.paths(folder) if not (skip_links and self.files[path][4]))
+
+    def has_files(self, folder=None):
+        #True if there is at least one regular file (i.e., not a broken link)
+        return any(self.files[path][1] is not None for path in self.paths(folder))
+
 class Unit:
     def __init__(self, controller):
         self.controller = controller
@@ -179,8 +1183,10 @@ class DigitalObject(Shipment):
         self.ffmpeg_temp_dir = os.path.join(self.temp_dir, 'ffmpeg')
         self.siegfried_db = os.path.join(self.temp_dir, 'siegfried.sqlite')
         self.cumulative_be_report = os.path.join(self.bulkext_dir, 'cumulative.txt')
+        self.bulkext_command = 'bulk_extractor -x aes -x base64 -x elf -x exif -x gps -x hiberfile -x httplogs -x json -x kml -x net -x pdf -x sqlite -x winlnk -x winpe -x winprefetch -S ssn_mode=2 -q -1 -o "{}" -R "{}" > "{}"'
         self.lsdvd_temp = os.path.join(self.temp_dir, 'lsdvd.txt')
         self.temp_dfxml = os.path.join(self.temp_dir, 'temp_dfxml.txt')
+        self.dfxml_journal = os.path.join(self.temp_dir, 'dfxml_journal.jsonl')
         self.dummy_audio = os.path.join(self.temp_dir, 'added_silence.mpg')
         self.cdr_scan = os.path.join(self.temp_dir, 'cdr_scan.txt')
         self.droid_profile = os.path.join(self.temp_dir, 'droid.droid')
@@ -204,6 +1210,13 @@ class DigitalObject(Shipment):
         if not self.skip_folders and not self.check_ingest_folders(): 
             self.create_folders() 
         
+        #digests calculated in a single read of each file and stored for reuse by later stages (bagging, SIP creation)
+        self.digest_algorithms = ['md5', 'sha1', 'sha256']
+        self.item_index_db = os.path.join(self.item_ingest_info, '{}-index.sqlite'.format(self.identifier))
+        
+        #cached folder listings (see ItemInventory), so we don't need to walk the same folder over and over
+        self.inventories = {}
+        
         #set up shelve
         self.temp_info = os.path.join(self.item_ingest_info, '{}-info'.format(self.identifier))
         self.db = shelve.open(self.temp_info, writeback=True)    
@@ -485,68 +1498,103 @@ class DigitalObject(Shipment):
         if os.path.isfile(start_path):
             total_size = os.path.getsize(start_path)
         else:
-            for dirpath, dirnames, filenames in os.walk(start_path):
-                for f in filenames:
-                    fp = os.path.join(dirpath, f)
-                    # skip if it is symbolic link
-                    if not os.path.islink(fp):
-                        total_size += os.path.getsize(fp)
+            # skip symbolic links
+            total_size = self.inventory(start_path).total_size(skip_links=True)
         return total_size
 
     def secure_copy(self, content_source):
 
-        #function takes the file source and destination as well as  a specific premis event to be used in documenting action
-        print('\n\nFILE REPLICATION: TERACOPY\n\n\tSOURCE: {} \n\tDESTINATION: {}'.format(content_source, self.files_dir))
+        #function takes the file source (a folder, drive, or a bdpl_transfer_list file listing one or more folders/files) and copies it to files_dir
+        print('\n\nFILE REPLICATION: bdpl_ingest\n\n\tSOURCE: {} \n\tDESTINATION: {}'.format(content_source, self.files_dir))
         
         #set variables for premis
         timestamp = str(datetime.datetime.now())             
-        teracopy_ver = "TeraCopy v3.26"
-        
-        destination = self.files_dir.replace('/', '\\')
+        copy_ver = 'https://github.com/IUBLibTech/bdpl_ingest'
+        copycmd = 'bdpl_ingest.py: copy "{}" to "{}" ({} checksums, verified against destination)'.format(content_source, self.files_dir, ', '.join(self.digest_algorithms))
         
-        #set variables for copy operation; note that if we are using a file list, TERACOPY requires a '*' before the source. 
+        #if we are using a file list, each line is a file or folder to be copied
         if os.path.isfile(content_source):
-            copycmd = 'TERACOPY COPY *"{}" "{}" /SkipAll /CLOSE'.format(content_source, destination)
+            with open(content_source, 'r', encoding='utf-8') as f:
+                sources = [line.strip() for line in f if line.strip()]
         else:
-            copycmd = 'TERACOPY COPY "{}" "{}" /SkipAll /CLOSE'.format(content_source, destination)
+            sources = [content_source]
+        
+        #build our list of copy jobs; folders are copied into files_dir by name, but the contents of a drive go straight into files_dir
+        jobs = []
+        folders = []
+        for source in sources:
+            drive, tail = os.path.splitdrive(source)
+            if tail.strip('\\/') == '':
+                source = drive + os.sep
+                destination = self.files_dir
+            else:
+                source = os.path.normpath(source)
+                destination = os.path.join(self.files_dir, os.path.basename(source))
+            
+            if os.path.isfile(source):
+                jobs.append((source, destination, os.stat(source)))
+            
+            elif os.path.isdir(source):
+                inventory = self.inventory(source)
+                for folder in inventory.dirs:
+                    folders.append((folder, os.path.normpath(os.path.join(destination, os.path.relpath(folder, inventory.root)))))
+                for path in inventory.paths():
+                    jobs.append((path, os.path.join(destination, os.path.relpath(path, inventory.root)), os.stat(path)))
+            
+            else:
+                print('\n\tWARNING: {} does not exist; skipping.'.format(source))
         
-        try:
-            exitcode = subprocess.call(copycmd, shell=True, text=True)
-        except subprocess.CalledProcessError as e:
-            print('\n\tFile replication failed:\n\n\t{}'.format(e))
-            return
-                
-        #need to find Teracopy SQLITE db and export list of copied files to csv log file
-        list_of_files = glob.glob(os.path.join(os.path.expandvars('C:\\Users\%USERNAME%\AppData\Roaming\TeraCopy\History'), '*'))
-        tera_db = max(list_of_files, key=os.path.getctime)
+        for folder, target in folders:
+            os.makedirs(target, exist_ok=True)
         
-        conn = sqlite3.connect(tera_db)
-        conn.text_factory = str
-        cur = conn.cursor()
-        results = cur.execute("SELECT * from Files")
+        digest_store = self.open_digest_store()
+        engine = CopyEngine(algorithms=self.digest_algorithms, digest_store=digest_store)
+        total = len(jobs)
+        counter = [0]
+        
+        #the destination digests go in the digest store, so DFXML creation won't need to read the files again
+        def copied(result):
+            job, digests, row = result
+            if row[2] == 'Copied':
+                digest_store.record(job[1], os.stat(job[1]), digests)
+            
+            counter[0] += 1
+            files_per_sec, mb_per_sec = engine.rate()
+            print('\r\tCopying file {} out of {} ({:.1f} files/s, {:.1f} MB/s)'.format(counter[0], total, files_per_sec, mb_per_sec), end='')
         
-        #now write the results to a csv file
+        #write our log of copied files as we go
         tera_log = os.path.join(self.log_dir, 'teracopy_log.csv')
         with open(tera_log, 'w', encoding='utf8') as output:
             writer = csv.writer(output, lineterminator='\n')
-            header = ['Source', 'Offset', 'State', 'Size', 'Attributes', 'IsFolder', 'Creation', 'Access', 'Write', 'SourceCRC', 'TargetCRC', 'TargetName', 'Message', 'Marked', 'Hidden']
-            writer.writerow(header)
-            writer.writerows(results)
-
-        cur.close()
-        conn.close()    
-        
-        #get count of files that were actually moved
-        count = 0
-        with open(tera_log, 'r', encoding='utf8') as input:
-            csvreader = csv.reader(input)
-            for row in csvreader:
-                if row[5] == '0':
-                    count += 1
-        print('\n\t{} files successfully transferred to {}.'.format(count, self.files_dir))
+            writer.writerow(CopyEngine.log_header)
+            
+            for folder, target in folders:
+                st = os.stat(folder)
+                writer.writerow([folder, 0, 'Copied', 0, getattr(st, 'st_file_attributes', ''), 1, engine.format_time(st.st_ctime), engine.format_time(st.st_atime), engine.format_time(st.st_mtime), '', '', target, '', 0, 0])
+            
+            engine.copy(jobs, writer, copied)
+        
+        digest_store.close()
+        
+        #now that folders are populated, set their timestamps (deepest first, so that parents aren't changed again)
+        for folder, target in reversed(folders):
+            try:
+                shutil.copystat(folder, target)
+            except OSError:
+                pass
+        
+        print('\n\n\t{} files successfully transferred to {}.'.format(engine.copied + engine.skipped, self.files_dir))
+        
+        if engine.skipped > 0:
+            print('\n\t{} files were already present at the destination.'.format(engine.skipped))
+        
+        exitcode = 0
+        if engine.failed > 0:
+            print('\n\tWARNING: {} files could not be copied or failed verification; see {}'.format(engine.failed, tera_log))
+            exitcode = 1
         
         #record premis
-        self.record_premis(timestamp, 'replication', exitcode, copycmd, 'Created a copy of an object that is, bit-wise, identical to the original.', teracopy_ver)       
+        self.record_premis(timestamp, 'replication', exitcode, copycmd, 'Created a copy of an object that is, bit-wise, identical to the original.', copy_ver)       
             
         print('\n\tFile replication completed; proceed to content analysis.')
         
@@ -805,7 +1853,7 @@ class DigitalObject(Shipment):
             self.fix_dates(outfolder)
         
         elif tool == 'unhfs' and os.path.exists(outfolder):
-            file_count = sum([len(files) for r, d, files in os.walk(outfolder)])
+            file_count = self.inventory(outfolder).count()
             print('\t{} files successfully transferred to {}.'.format(file_count, outfolder))
             
         print('\n\tFile replication completed; proceed to content analysis.')
@@ -813,7 +1861,6 @@ class DigitalObject(Shipment):
     def produce_dfxml(self, target):
     
         timestamp = str(datetime.datetime.now())
-        file_stats = []
         
         #use fiwalk if we have an image file
         if os.path.isfile(target):
@@ -821,82 +1868,82 @@ class DigitalObject(Shipment):
             dfxml_ver_cmd = 'fiwalk-0.6.3 -V'
             dfxml_ver = subprocess.check_output(dfxml_ver_cmd, shell=True, text=True).splitlines()[0]
             dfxml_cmd = 'fiwalk-0.6.3 -x {} > {}'.format(target, self.dfxml_output)
-            exitcode = subprocess.call(dfxml_cmd, shell=True, text=True)
-                    
-            #parse dfxml to get info for later; because large DFXML files pose a challenge; use iterparse to avoid crashing (Note: for DVD jobs we will also get stats on the files themselves later on) 
+            
+            #parse fiwalk's output as it is produced instead of waiting for it to finish and reading the file back in; TeeReader saves a copy to self.dfxml_output along the way.  Use iterparse to avoid crashing on large DFXML files (Note: for DVD jobs we will also get stats on the files themselves later on) 
             print('\n\tCollecting file statistics...\n')
+            fiwalk = subprocess.Popen('fiwalk-0.6.3 -x {}'.format(target), shell=True, stdout=subprocess.PIPE)
+            
+            #per-file facts go into a sidecar index in the same pass, so fix_dates and get_stats don't have to parse the DFXML again
+            dfxml_index = DfxmlIndex(self.item_index_db)
+            dfxml_index.clear()
             counter = 0
-            for event, element in etree.iterparse(self.dfxml_output, events = ("end",), tag="fileobject"):
-                
-                #refresh dict for each fileobject
-                file_dict = {}
+            with TeeReader(fiwalk.stdout, self.dfxml_output) as dfxml_stream:
+                try:
+                    for event, element in etree.iterparse(dfxml_stream, events = ("end",), tag="fileobject"):
+                        
+                        #gather values for each fileobject
+                        values = {}
+                        for child in element:
+                            if child.tag == "hashdigest":
+                                if child.attrib['type'] == 'md5':
+                                    values['md5'] = child.text
+                            else:
+                                values[child.tag] = child.text
+                        
+                        element.clear()
+                        
+                        alloc = values.get('alloc', '1') == '1' and values.get('unalloc') != '1'
+                        dfxml_index.add(values.get('filename'), values.get('name_type'), values.get('filesize'), alloc, values.get('inode'), values.get('mtime'), values.get('crtime'), values.get('md5'))
+                        
+                        #report on allocated files
+                        if alloc and values.get('name_type', 'r') == 'r':
+                            counter+=1            
+                            print('\r\tWorking on file #: {}'.format(counter), end='')
                 
-                #default values; will make sure that we don't record info about non-allocated files and that we have a default timestamp value
-                good = True
-                mt = False
-                mtime = 'undated'
-                target = ''
-                size = ''
-                checksum = ''
+                except etree.XMLSyntaxError:
+                    print('\n\tUnable to read DFXML!')
                 
-                for child in element:
-                    
-                    if child.tag == "filename":
-                        target = child.text
-                    if child.tag == "name_type":
-                        if child.text != "r":
-                            element.clear()
-                            good = False
-                            break
-                    if child.tag == "alloc":
-                        if child.text != "1":
-                            good = False
-                            element.clear()
-                            break
-                    if child.tag == "unalloc":
-                        if child.text == "1":
-                            good = False
-                            element.clear()
-                            break
-                    if child.tag == "filesize":
-                        size = child.text
-                    if child.tag == "hashdigest":
-                        if child.attrib['type'] == 'md5':
-                            checksum = child.text
-                    if child.tag == "mtime":
-                        mtime = datetime.datetime.utcfromtimestamp(int(child.text)).isoformat()
-                        mt = True
-                    if child.tag == "crtime" and mt == False:
-                        mtime = datetime.datetime.utcfromtimestamp(int(child.text)).isoformat()
-                
-                if good and not '' in file_dict.values():
-                    file_dict = { 'name' : target, 'size' : size, 'mtime' : mtime, 'checksum' : checksum}
-                    file_stats.append(file_dict)
-                    
-                    counter+=1            
-                    print('\r\tWorking on file #: {}'.format(counter), end='')
-
-                element.clear()
+                #make sure all of fiwalk's output is saved, even if parsing stopped early
+                dfxml_stream.drain()
+            
+            exitcode = fiwalk.wait()
+            dfxml_index.finish(self.dfxml_output)
+            dfxml_index.close()
                 
             if self.job_type == 'DVD':
-            
-                #save info from DVD checksums to separate file
-                with open (self.checksums_dvd, 'wb') as f:
-                    pickle.dump(file_stats, f)
                 
-                #now compile stats for the normalized file versions
-                file_stats = []
+                #now compile stats for the normalized file versions; checksums are usually already in the digest store (see normalize_dvd_content), otherwise titles are hashed in parallel.  Stats on the files in the disk image itself stay in the DFXML index.
+                engine = ChecksumEngine(workers=2, algorithms=self.digest_algorithms)
+                digest_store = self.open_digest_store()
+                
+                titles = []
                 for f in os.listdir(self.files_dir):
                     file = os.path.join(self.files_dir, f)
-                    file_dict = {}
-                    size = os.path.getsize(file)
-                    mtime = datetime.datetime.fromtimestamp(os.path.getmtime(file)).isoformat()
-                    ctime = datetime.datetime.fromtimestamp(os.path.getctime(file)).isoformat()
-                    atime = datetime.datetime.fromtimestamp(os.path.getatime(file)).isoformat()[:-7]
-                    checksum = self.md5(file)
+                    st = os.stat(file)
+                    titles.append((file, st, digest_store.lookup(file, st)))
+                
+                def title_digests(title):
+                    file, st, digests = title
+                    if digests is None:
+                        digests, size = engine.digest_file(file)
+                        return (file, st, digests, True)
+                    return (file, st, digests, False)
+                
+                for file, st, digests, new in engine.imap(title_digests, titles):
+                    mtime = datetime.datetime.fromtimestamp(st.st_mtime).isoformat()
+                    ctime = datetime.datetime.fromtimestamp(st.st_ctime).isoformat()
+                    atime = datetime.datetime.fromtimestamp(st.st_atime).isoformat()[:-7]
                     
-                    file_dict = { 'name' : file, 'size' : size, 'mtime' : mtime, 'ctime' : ctime, 'atime' : atime, 'checksum' : checksum}
-                    file_stats.append(file_dict)  
+                    digest_store.record(file, st, digests, (mtime, ctime, atime))
+                
+                digest_store.close()
+                
+                #file stats for reporting will be read from the digest store
+                self.db['file_stats_dir'] = self.files_dir
+            
+            else:
+                #file stats for reporting will be read from the DFXML index
+                self.db.pop('file_stats_dir', None)
      
         #use custom operation for other cases    
         elif os.path.isdir(target):
@@ -907,97 +1954,101 @@ class DigitalObject(Shipment):
             
             timestamp = str(datetime.datetime.now().isoformat())
             
-            done_list = []
-
+            #stat and hash files in parallel; results come back in the original walk order so DFXML fileobjects stay in the same sequence
+            engine = ChecksumEngine(algorithms=self.digest_algorithms)
+            digest_store = self.open_digest_store()
+            reused = 0
+            
+            #load our crash-resume journal, in case we've already collected info for some files; commit digests before each journal flush so the two stay in step
+            journal = ResumeJournal(self.dfxml_journal, before_flush=digest_store.commit)
+            
+            #pick up progress recorded in the older temp_dfxml format; the filename is the only field that may contain ' | '
             if os.path.exists(self.temp_dfxml):
                 with open(self.temp_dfxml, 'r', encoding='utf-8') as f:
-                    done_so_far = f.read().splitlines()
-                    for d in done_so_far:
-                        line = d.split(' | ')
-                        done_list.append(line[0])
-                        file_dict = { 'name' : line[0], 'size' : line[1], 'mtime' : line[2], 'ctime' : line[3], 'atime' : line[4], 'checksum' : line[5], 'counter' : line[6] }
-                        file_stats.append(file_dict)
-            
-            if len(file_stats) > 0:
-                counter = int(file_stats[-1]['counter'])
-            else:
-                counter = 0
+                    for d in f:
+                        line = d.rstrip('\n').rsplit(' | ', 6)
+                        if len(line) == 7 and not line[0] in journal:
+                            journal.append({ 'name' : line[0], 'size' : line[1], 'mtime' : line[2], 'ctime' : line[3], 'atime' : line[4], 'checksum' : line[5], 'counter' : line[6] })
+                journal.flush()
+                os.remove(self.temp_dfxml)
             
-            print('\n')
+            counter = len(journal)
             
-            #get total number of files
-            total = sum([len(files) for r, d, files in os.walk(target)])
+            print('\n')
             
-            #now loop through, keeping count
-            for root, dirnames, filenames in os.walk(target):
-                for file in filenames:
-                    
-                    #check to make sure that we haven't already added info for this file
-                    file_target = os.path.join(root, file)
-                    
-                    if file_target in done_list:
+            #get total number of files from a single pass through the folder
+            inventory = self.inventory(target)
+            total = inventory.count()
+
+            #list files that still need checksums, in walk order; skip anything we've already added info for
+            def pending_files():
+                for file_target in inventory.paths():
+                    if file_target in journal:
                         continue
+                    yield file_target
+
+            def collect_stats(file_target):
+                st = os.stat(file_target)
+                mtime = datetime.datetime.fromtimestamp(st.st_mtime).isoformat()
+                ctime = datetime.datetime.fromtimestamp(st.st_ctime).isoformat()
+                atime = datetime.datetime.fromtimestamp(st.st_atime).isoformat()[:-7]
+                
+                #only hash files that are new or have changed since we last calculated digests (i.e., when re-analyzing)
+                digests = digest_store.lookup(file_target, st)
+                new = digests is None
+                if new:
+                    digests, size = engine.digest_file(file_target)
                     
-                    counter += 1
-                    print('\r\tCalculating checksum for file {} out of {}'.format(counter, total), end='')
-                    
-                    size = os.path.getsize(file_target)
-                    mtime = datetime.datetime.fromtimestamp(os.path.getmtime(file_target)).isoformat()
-                    ctime = datetime.datetime.fromtimestamp(os.path.getctime(file_target)).isoformat()
-                    atime = datetime.datetime.fromtimestamp(os.path.getatime(file_target)).isoformat()[:-7]
-                    checksum = self.md5(file_target)
-                    file_dict = { 'name' : file_target, 'size' : size, 'mtime' : mtime, 'ctime' : ctime, 'atime' : atime, 'checksum' : checksum, 'counter' : counter }                 
-                    file_stats.append(file_dict)
-                    done_list.append(file_target)
+                file_dict = { 'name' : file_target, 'size' : st.st_size, 'mtime' : mtime, 'ctime' : ctime, 'atime' : atime, 'checksum' : digests['md5'] }
+                return (file_dict, st, digests, new)
+
+            #write DFXML as we go, so that we never hold the full list of files in memory; files we handled before a crash are written first (from the journal)
+            with DfxmlWriter(self.dfxml_output, timestamp) as dfxml:
+                for file_dict in journal.records():
+                    dfxml.add(file_dict)
                     
-                    #save this list to file just in case we crash...
-                    raw_stats = "{} | {} | {} | {} | {} | {} | {}\n".format(file_target, size, mtime, ctime, atime, checksum, counter)
-                    with open(self.temp_dfxml, 'a', encoding='utf8') as f:
-                        f.write(raw_stats)
+                    #make sure resumed files are also in the digest store, as that's where reporting will look for them
+                    if os.path.exists(file_dict['name']) and digest_store.lookup(file_dict['name']) is None:
+                        digest_store.record(file_dict['name'], os.stat(file_dict['name']), {'md5' : file_dict['checksum']}, (file_dict['mtime'], file_dict['ctime'], file_dict['atime']))
+                
+                for file_dict, st, digests, new in engine.imap(collect_stats, pending_files()):
+
+                    #keep all digests and stat info so re-analysis, bagging, SIP creation, and reporting don't have to read the file again (digests recorded during replication won't have timestamps yet)
+                    digest_store.record(file_dict['name'], st, digests, (file_dict['mtime'], file_dict['ctime'], file_dict['atime']))
+                    if not new:
+                        reused += 1
+
+                    counter += 1
+                    file_dict['counter'] = counter
+                    dfxml.add(file_dict)
+
+                    #save this info to our journal just in case we crash...
+                    journal.append(file_dict)
+
+                    files_per_sec, mb_per_sec = engine.rate()
+                    print('\r\tCalculating checksum for file {} out of {} ({:.1f} files/s, {:.1f} MB/s)'.format(counter, total, files_per_sec, mb_per_sec), end='')
+
+            journal.close()
+
+            #drop cached entries for files that have since been removed
+            digest_store.prune(target, journal)
+            digest_store.close()
+
+            if reused > 0:
+                print('\n\n\t{} unchanged files did not need new checksums.'.format(reused))
             
-            print('\n')
+            #DFXML is complete, so we no longer need the crash journal; the digest store lets a re-analysis skip unchanged files
+            journal.remove()
             
-            dc_namespace = 'http://purl.org/dc/elements/1.1/'
-            dc = "{%s}" % dc_namespace
-            NSMAP = {None : 'http://www.forensicswiki.org/wiki/Category:Digital_Forensics_XML',
-                    'xsi': "http://www.w3.org/2001/XMLSchema-instance",
-                    'dc' : dc_namespace}
-            dfxml = etree.Element("dfxml", nsmap=NSMAP, version="1.0")
-            metadata = etree.SubElement(dfxml, "metadata")
-            dctype = etree.SubElement(metadata, dc + "type")
-            dctype.text = "Hash List"
-            creator = etree.SubElement(dfxml, 'creator')
-            program = etree.SubElement(creator, 'program')
-            program.text = 'bdpl_ingest'
-            execution_environment = etree.SubElement(creator, 'execution_environment')
-            start_time = etree.SubElement(execution_environment, 'start_time')
-            start_time.text = timestamp
-            
-            for f in file_stats:
-                fileobject = etree.SubElement(dfxml, 'fileobject')
-                filename = etree.SubElement(fileobject, 'filename')
-                filename.text = f['name']
-                filesize = etree.SubElement(fileobject, 'filesize')
-                filesize.text = str(f['size'])
-                modifiedtime = etree.SubElement(fileobject, 'mtime')
-                modifiedtime.text = f['mtime']
-                createdtime = etree.SubElement(fileobject, 'ctime')
-                createdtime.text = f['ctime']
-                accesstime = etree.SubElement(fileobject, 'atime')
-                accesstime.text = f['atime']
-                hashdigest = etree.SubElement(fileobject, 'hashdigest', type='md5')
-                hashdigest.text = f['checksum']
-
-            tree = etree.ElementTree(dfxml)
-            tree.write(self.dfxml_output, pretty_print=True, xml_declaration=True, encoding="utf-8")      
+            #file stats for reporting will be read from the digest store; note which folder they cover and clear out any stale pickled copy from older versions
+            self.db['file_stats_dir'] = target
+            if os.path.exists(self.checksums):
+                os.remove(self.checksums)
         
         else:
             messagebox.showwarning(title='WARNING', message='{} does not appear to exist...'.format(target), master=self)
             return
         
-        #save stats for reporting...            
-        with open (self.checksums, 'wb') as f:
-            pickle.dump(file_stats, f)
         
         #save PREMIS
         self.record_premis(timestamp, 'message digest calculation', 0, dfxml_cmd, 'Extracted information about the structure and characteristics of content, including file checksums.', dfxml_ver)
@@ -1011,64 +2062,71 @@ class DigitalObject(Shipment):
         
         timestamp = str(datetime.datetime.now())
          
+        #build an index of path -> timestamp first; if a path shows up more than once, the last entry wins (as it would if we updated files as we went)
+        date_index = {}
+        skipped = 0
         try:
-            for (event, obj) in Objects.iterparse(self.dfxml_output):
-                # only work on FileObjects
-                if not isinstance(obj, Objects.FileObject):
-                    continue
-
-                # skip directories and links
-                if obj.name_type:
-                    if obj.name_type not in ["r", "d"]:
-                        continue
-
-                # record filename
-                dfxml_filename = obj.filename
-                dfxml_filedate = int(time.time()) # default to current time
-
-                # record last modified or last created date
-                try:
-                    mtime = obj.mtime
-                    mtime = str(mtime)
-                except:
-                    pass
-
-                try:
-                    crtime = obj.crtime
-                    crtime = str(crtime)
-                except:
-                    pass
-
+            #timestamps come from the DFXML index, which is built while produce_dfxml parses fiwalk's output
+            dfxml_index = self.open_dfxml_index()
+            date_records = list(dfxml_index.dates())
+            dfxml_index.close()
+            
+            for (dfxml_filename, mtime, crtime) in date_records:
+                
                 # fallback to created date if last modified doesn't exist
-                if mtime and (mtime != 'None'):
-                    mtime = time_to_int(mtime[:19])
-                    dfxml_filedate = mtime
-                elif crtime and (crtime != 'None'):
-                    crtime = time_to_int(crtime[:19])
-                    dfxml_filedate = crtime
-                else:
-                    continue
-
-                # rewrite last modified date of corresponding file in objects/files
-                exported_filepath = os.path.join(outfolder, dfxml_filename)
-                if os.path.isdir(exported_filepath):
-                    os.utime(exported_filepath, (dfxml_filedate, dfxml_filedate))
-                elif os.path.isfile(exported_filepath):
-                    os.utime(exported_filepath, (dfxml_filedate, dfxml_filedate)) 
-                else:
+                dfxml_time = mtime or crtime
+                if not dfxml_time or not dfxml_filename:
+                    skipped += 1
                     continue
+                
+                try:
+                    date_index[os.path.join(outfolder, dfxml_filename)] = self.time_to_int(dfxml_time)
+                except (ValueError, OverflowError, OSError):
+                    skipped += 1
 
-        except (ValueError, xml.etree.ElementTree.ParseError):
+        except (ValueError, sqlite3.Error):
             print('\nUnable to read DFXML!')
             pass
         
+        #rewrite last modified dates of corresponding files in objects/files.  Each update is a small metadata write, so on network storage most of the time is spent waiting on the server; use a pool of threads to keep many requests in flight.
+        def apply_dates(batch):
+            applied = missing = failed = 0
+            for path, dfxml_filedate in batch:
+                try:
+                    os.utime(path, (dfxml_filedate, dfxml_filedate))
+                    applied += 1
+                except FileNotFoundError:
+                    missing += 1
+                except OSError:
+                    failed += 1
+            return (applied, missing, failed)
+        
+        items = list(date_index.items())
+        batches = [items[i:i+256] for i in range(0, len(items), 256)]
+        applied = missing = done = 0
+        with ThreadPoolExecutor(max_workers=16) as executor:
+            for a, m, f in executor.map(apply_dates, batches):
+                applied += a
+                missing += m
+                skipped += f
+                done += a + m + f
+                print('\r\tWorking on {} of {} files and folders'.format(done, len(items)), end='')
+        
+        print('\n\tTimestamps applied: {}; files not found: {}; skipped: {}'.format(applied, missing, skipped))
+        
         #record event in PREMIS metadata
         self.record_premis(timestamp, 'metadata modification', 0, 'https://github.com/CCA-Public/diskimageprocessor/blob/master/diskimageprocessor.py#L446-L489', 'Corrected file timestamps to match information extracted from disk image.', 'Adapted from Disk Image Processor Version: 1.0.0 (Tim Walsh)')
     
     def time_to_int(self, str_time):
         """ Convert datetime to unix integer value """
-        dt = time.mktime(datetime.datetime.strptime(str_time, 
-            "%Y-%m-%dT%H:%M:%S").timetuple())
+        #fiwalk may report times as seconds since the epoch; these are UTC.  Add them to the epoch instead of using time.gmtime, which rejects negative values on Windows
+        if str_time[4:5] != '-':
+            return time.mktime((datetime.datetime(1970, 1, 1) + datetime.timedelta(seconds=float(str_time))).timetuple())
+        
+        #ISO 8601 (only the first 19 characters, 'YYYY-MM-DDTHH:MM:SS', are used); slicing is much faster than strptime.  Like strptime + mktime, the time is read as local time.
+        if len(str_time) < 19 or str_time[10] != 'T' or str_time[13] != ':' or str_time[16] != ':':
+            raise ValueError('Unexpected time format: {}'.format(str_time))
+        dt = time.mktime((int(str_time[0:4]), int(str_time[5:7]), int(str_time[8:10]), int(str_time[11:13]), int(str_time[14:16]), int(str_time[17:19]), 0, 0, -1))
         return dt
     
     def lsdvd_check(self, drive_letter):
@@ -1132,64 +2190,92 @@ class DigitalObject(Shipment):
         
         print('\n\nMOVING IMAGE FILE NORMALIZATION: FFMPEG')
         
-        #loop through titles and rip each one to mpeg using native streams
-        for title in range(1, (titlecount+1)):
-            titlelist = glob.glob(os.path.join(drive_letter, "**/VIDEO_TS", "VTS_{}_*.VOB".format(str(title).zfill(2))), recursive=True)
-            #be sure list is sorted
-            sorted(titlelist)
+        #calculate checksums for each title in the background while ffmpeg works on the next one; DFXML creation will pick these up from the digest store
+        engine = ChecksumEngine(workers=2, algorithms=self.digest_algorithms)
+        hash_pool = ThreadPoolExecutor(max_workers=engine.workers)
+        hash_jobs = []
+        
+        #whether we finish or bail out, return to our directory and save the checksums of any titles already normalized
+        try:
+            #loop through titles and rip each one to mpeg using native streams
+            for title in range(1, (titlecount+1)):
+                titlelist = glob.glob(os.path.join(drive_letter, "**/VIDEO_TS", "VTS_{}_*.VOB".format(str(title).zfill(2))), recursive=True)
+                #be sure list is sorted
+                sorted(titlelist)
             
-            if len(titlelist) > 0:
+                if len(titlelist) > 0:
                 
-                #check if title track is missing audio--could make trouble for other tracks...
-                audio_test = {}
-                print('\n\tChecking audio streams...')
-                for t in titlelist:
-                    cmd = "ffprobe -i {} -hide_banner -show_streams -select_streams a -loglevel error".format(t)
-                    try:
-                        audio_check = subprocess.check_output(cmd, shell=True, text=True)
-                        audio_test[t] = audio_check
-                    except subprocess.CalledProcessError:
-                        pass
+                    #check if title track is missing audio--could make trouble for other tracks...
+                    audio_test = {}
+                    print('\n\tChecking audio streams...')
+                    for t in titlelist:
+                        cmd = "ffprobe -i {} -hide_banner -show_streams -select_streams a -loglevel error".format(t)
+                        try:
+                            audio_check = subprocess.check_output(cmd, shell=True, text=True)
+                            audio_test[t] = audio_check
+                        except subprocess.CalledProcessError:
+                            pass
                 
-                if len(audio_test) == 0:
-                    messagebox.showwarning(title='WARNING', message='Unable to access information on DVD. Moving image normalization has failed...', master=self)
-                    return
+                    if len(audio_test) == 0:
+                        messagebox.showwarning(title='WARNING', message='Unable to access information on DVD. Moving image normalization has failed...', master=self)
+                        return
                 
-                #if there's no audio in any track, it's OK
-                if all(value == '' for value in audio_test.values()):
-                    pass
+                    #if there's no audio in any track, it's OK
+                    if all(value == '' for value in audio_test.values()):
+                        pass
                     
-                #if our first track lacks audio, add a dummy track
-                elif audio_test[titlelist[0]] == '':
+                    #if our first track lacks audio, add a dummy track
+                    elif audio_test[titlelist[0]] == '':
                     
-                    cmd = "ffmpeg -y -nostdin -loglevel warning -i {} -f lavfi -i anullsrc -c:v copy -c:a aac -shortest -target ntsc-dvd {{}".format(titlelist[0], self.dummy_audio)
+                        cmd = "ffmpeg -y -nostdin -loglevel warning -i {} -f lavfi -i anullsrc -c:v copy -c:a aac -shortest -target ntsc-dvd {{}".format(titlelist[0], self.dummy_audio)
                     
-                    print('\n\tCorrecting missing audio on first track...')
+                        print('\n\tCorrecting missing audio on first track...')
                     
-                    subprocess.call(cmd, text=True)
+                        subprocess.call(cmd, text=True)
                     
-                    #replace original item from list
-                    del titlelist[0]
-                    titlelist.insert(0, dummy_audio)
+                        #replace original item from list
+                        del titlelist[0]
+                        titlelist.insert(0, dummy_audio)
                 
-                timestamp = str(datetime.datetime.now())
+                    timestamp = str(datetime.datetime.now())
                 
-                ffmpegout = os.path.join(self.files_dir, '{}-{}.mpg'.format(self.identifier, str(title).zfill(2)))
-                ffmpeg_cmd = 'ffmpeg -y -nostdin -loglevel warning -report -stats -i "concat:{}" -c copy -target ntsc-dvd {}'.format('|'.join(titlelist), ffmpegout)
+                    ffmpegout = os.path.join(self.files_dir, '{}-{}.mpg'.format(self.identifier, str(title).zfill(2)))
+                    ffmpeg_cmd = 'ffmpeg -y -nostdin -loglevel warning -report -stats -i "concat:{}" -c copy -target ntsc-dvd {}'.format('|'.join(titlelist), ffmpegout)
                 
-                print('\n\tGenerating title {} of {}: {}\n'.format(str(title), str(titlecount), ffmpegout))
+                    print('\n\tGenerating title {} of {}: {}\n'.format(str(title), str(titlecount), ffmpegout))
                 
-                exitcode = subprocess.call(ffmpeg_cmd, shell=True, text=True)
+                    exitcode = subprocess.call(ffmpeg_cmd, shell=True, text=True)
                 
-                #record event in PREMIS metadata                
-                self.record_premis(timestamp, 'normalization', exitcode, ffmpeg_cmd, 'Transformed object to an institutionally supported preservation format (.MPG) with a direct copy of all streams.', ffmpeg_ver)
+                    if exitcode == 0 and os.path.exists(ffmpegout):
+                        st = os.stat(ffmpegout)
+                        hash_jobs.append((ffmpegout, st, hash_pool.submit(engine.digest_file, ffmpegout)))
                 
-                #move and rename ffmpeg log file
-                ffmpeglog = glob.glob(os.path.join(self.ffmpeg_temp_dir, 'ffmpeg-*.log'))[0]
-                shutil.move(ffmpeglog, os.path.join(self.log_dir, '{}-{}-ffmpeg.log'.format(identifier, str(title).zfill(2))))
+                    #record event in PREMIS metadata                
+                    self.record_premis(timestamp, 'normalization', exitcode, ffmpeg_cmd, 'Transformed object to an institutionally supported preservation format (.MPG) with a direct copy of all streams.', ffmpeg_ver)
                 
-        #move back to original directory
-        os.chdir(bdpl_cwd)
+                    #move and rename ffmpeg log file
+                    ffmpeglog = glob.glob(os.path.join(self.ffmpeg_temp_dir, 'ffmpeg-*.log'))[0]
+                    shutil.move(ffmpeglog, os.path.join(self.log_dir, '{}-{}-ffmpeg.log'.format(identifier, str(title).zfill(2))))
+        
+        finally:
+            #move back to original directory
+            os.chdir(bdpl_cwd)
+        
+            #wait for any remaining checksums, then save them (sqlite connections can't be shared with our worker threads, so we record results here).  Shutting the pool down first means it is released even if saving fails
+            if hash_jobs:
+                print('\n\tFinishing checksum calculation for normalized titles...')
+            hash_pool.shutdown()
+            digest_store = self.open_digest_store()
+            try:
+                for ffmpegout, st, job in hash_jobs:
+                    try:
+                        digests, size = job.result()
+                    except OSError as e:
+                        print('\n\tUnable to calculate checksums for {}: {}'.format(ffmpegout, e))
+                        continue
+                    digest_store.record(ffmpegout, st, digests)
+            finally:
+                digest_store.close()
         
         print('\n\tMoving image normalization completed; proceed to content analysis.')
 
@@ -1295,17 +2381,97 @@ class DigitalObject(Shipment):
         
         print('\n\tAudio normalization complete; proceed to content analysis.')
     
-    def run_antivirus(self):
+    def run_antivirus(self, delta=None):
        
         #get version
         cmd = 'clamscan -V'
         av_ver = subprocess.check_output(cmd, text=True).rstrip()
+        
+        #when re-analyzing, only scan new and changed files (see content_delta); results for other files are carried over from the previous log.  If that fails, fall back on a full scan
+        if delta is not None and os.path.exists(self.virus_log) and self.run_antivirus_delta(delta, av_ver):
+            return
 
         av_command = 'clamscan -i -l {} --recursive {}'.format(self.virus_log, self.files_dir)  
         
         timestamp = str(datetime.datetime.now())
         exitcode = subprocess.call(av_command, shell=True, text=True)
         
+        self.virus_scan_results()
+        
+        #save preservation metadata to PREMIS
+        self.record_premis(timestamp, 'virus check', exitcode, av_command, 'Scanned files for malicious programs.', av_ver)
+        
+        print('\n\tVirus scan completed; moving on to next step...')
+    
+    def run_antivirus_delta(self, delta, av_ver):
+        
+        timestamp = str(datetime.datetime.now())
+        exitcode = 0
+        av_command = 'clamscan (no new or changed files to scan)'
+        
+        #clamscan -i only logs infected files, followed by a summary
+        infected = []
+        with open(self.virus_log, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.rstrip('\n')
+                if line.endswith(' FOUND'):
+                    name, result = line.rsplit(': ', 1)
+                    name = self.carry_over(name, delta)
+                    if name is not None:
+                        infected.append('{}: {}'.format(name, result))
+        
+        summary = []
+        if delta['rescan']:
+            file_list = os.path.join(self.temp_dir, 'viruscheck-files.txt')
+            delta_log = os.path.join(self.temp_dir, 'viruscheck-delta-log.txt')
+            with open(file_list, 'w', encoding='utf-8') as f:
+                for file in delta['rescan']:
+                    f.write('{}\n'.format(file))
+            
+            av_command = 'clamscan -i -l "{}" --file-list="{}"'.format(delta_log, file_list)
+            exitcode = subprocess.call(av_command, shell=True, text=True)
+            os.remove(file_list)
+            
+            if not os.path.exists(delta_log):
+                print('\n\tVirus scan of new and changed files failed; scanning all files...')
+                return False
+            
+            in_summary = False
+            with open(delta_log, 'r', encoding='utf-8') as f:
+                for line in f:
+                    line = line.rstrip('\n')
+                    if 'SCAN SUMMARY' in line:
+                        in_summary = True
+                    if in_summary:
+                        summary.append(line)
+                    elif line.endswith(' FOUND'):
+                        infected.append(line)
+            
+            os.remove(delta_log)
+        
+        #rewrite the log with the combined results
+        with open(self.virus_log, 'w', encoding='utf-8') as f:
+            for line in infected:
+                f.write('{}\n'.format(line))
+            f.write('\n----------- SCAN SUMMARY -----------\n')
+            f.write('Infected files: {}\n'.format(len(infected)))
+            f.write('Rescanned files: {} (new or changed since the last scan)\n'.format(len(delta['rescan'])))
+            f.write('Carried over: {} (unchanged files; results from the last scan)\n'.format(len(delta['keep'])))
+            for line in summary:
+                if not 'SCAN SUMMARY' in line and not line.startswith('Infected files:'):
+                    f.write('{}\n'.format(line))
+        
+        self.virus_scan_results()
+        
+        #save preservation metadata to PREMIS
+        self.record_premis(timestamp, 'virus check', exitcode, av_command, 'Scanned new and changed files for malicious programs; results for unchanged files were carried over from the previous scan.', av_ver)
+        
+        print('\n\tVirus scan completed; moving on to next step...')
+        
+        return True
+    
+    def virus_scan_results(self):
+        
         #store virus scan results in db['info']
         with open(self.virus_log, 'r') as f:
             if "Infected files: 0" not in f.read():
@@ -1315,11 +2481,6 @@ class DigitalObject(Shipment):
 
         #save db['info'] to file, just in case
         self.db.sync()
-        
-        #save preservation metadata to PREMIS
-        self.record_premis(timestamp, 'virus check', exitcode, av_command, 'Scanned files for malicious programs.', av_ver)
-        
-        print('\n\tVirus scan completed; moving on to next step...')
 
     def document_dir_tree(self):
         
@@ -1336,7 +2497,7 @@ class DigitalObject(Shipment):
         
         print('\n\tDirectory structure documented; moving on to next step...')
     
-    def run_bulkext(self):
+    def run_bulkext(self, delta=None):
 
         #get bulk extractor version for premis
         try:
@@ -1344,10 +2505,14 @@ class DigitalObject(Shipment):
         except subprocess.CalledProcessError as e:
             be_ver = e.output.rstrip()
         
+        #when re-analyzing, only scan new and changed files (see content_delta); features in other files are carried over from the previous scan.  If that fails, fall back on a full scan
+        if delta is not None and os.path.exists(self.bulkext_dir) and os.listdir(self.bulkext_dir) and self.run_bulkext_delta(delta, be_ver):
+            return
+        
         print('\n\tScan underway...be patient!\n')
         
         #use default command with buklk_extractor
-        bulkext_command = 'bulk_extractor -x aes -x base64 -x elf -x exif -x gps -x hiberfile -x httplogs -x json -x kml -x net -x pdf -x sqlite -x winlnk -x winpe -x winprefetch -S ssn_mode=2 -q -1 -o "{}" -R "{}" > "{}"'.format(self.bulkext_dir, self.files_dir, self.bulkext_log)
+        bulkext_command = self.bulkext_command.format(self.bulkext_dir, self.files_dir, self.bulkext_log)
         
         if os.path.exists(self.bulkext_dir):
             shutil.rmtree(self.bulkext_dir)
@@ -1366,6 +2531,121 @@ class DigitalObject(Shipment):
         #record event in PREMIS metadata
         self.record_premis(timestamp, 'sensitive data scan', exitcode, bulkext_command, 'Scanned files for potentially sensitive information, including Social Security and credit card numbers.', be_ver)
         
+        self.summarize_bulkext()
+        
+        print('\n\tSensitive data scan completed; moving on to next step...')
+    
+    def run_bulkext_delta(self, delta, be_ver):
+        
+        timestamp = str(datetime.datetime.now())
+        exitcode = 0
+        bulkext_command = 'bulk_extractor (no new or changed files to scan)'
+        
+        delta_input = os.path.join(self.temp_dir, 'bulk_extractor_input')
+        delta_output = os.path.join(self.temp_dir, 'bulk_extractor_delta')
+        for folder in [delta_input, delta_output]:
+            if os.path.exists(folder):
+                shutil.rmtree(folder)
+        
+        if delta['rescan']:
+            print('\n\tScanning {} new or changed files...\n'.format(len(delta['rescan'])))
+            
+            #bulk_extractor scans folders, so gather the files to scan in a folder of their own (as hard links, so nothing is copied), keeping their relative paths
+            for file in delta['rescan']:
+                target = os.path.join(delta_input, os.path.relpath(file, delta['root']))
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                try:
+                    os.link(file, target)
+                except OSError:
+                    shutil.copy2(file, target)
+            
+            bulkext_command = self.bulkext_command.format(delta_output, delta_input, self.bulkext_log)
+            exitcode = subprocess.call(bulkext_command, shell=True, text=True)
+            
+            if exitcode != 0 or not os.path.exists(delta_output):
+                print('\n\tSensitive data scan of new and changed files failed; scanning all files...')
+                for folder in [delta_input, delta_output]:
+                    if os.path.exists(folder):
+                        shutil.rmtree(folder)
+                return False
+        
+        #bulk_extractor may report paths in the scanned folder with other separators (or, on Windows, in another case), so normalize them before comparing
+        input_prefix = os.path.normcase(delta_input.replace('/', os.sep))
+        
+        #combine feature files: lines for unchanged (or renamed) files from the previous scan, then lines from this one
+        names = set([f for f in os.listdir(self.bulkext_dir) if f.endswith('.txt')])
+        if os.path.exists(delta_output):
+            names.update([f for f in os.listdir(delta_output) if f.endswith('.txt')])
+        
+        for name in names:
+            if name.endswith('_histogram.txt') or name == os.path.basename(self.cumulative_be_report):
+                continue
+            
+            previous = os.path.join(self.bulkext_dir, name)
+            current = os.path.join(delta_output, name)
+            header = []
+            features = []
+            
+            if os.path.exists(previous):
+                with open(previous, 'r', encoding='utf-8', errors='surrogateescape') as f:
+                    for line in f:
+                        if line.startswith('#'):
+                            header.append(line)
+                            continue
+                        forensic_path, sep, rest = line.partition('\t')
+                        forensic_path = self.carry_over(forensic_path, delta, '-/\\#:')
+                        if forensic_path is not None:
+                            features.append(forensic_path + sep + rest)
+            
+            if os.path.exists(current):
+                with open(current, 'r', encoding='utf-8', errors='surrogateescape') as f:
+                    for line in f:
+                        if line.startswith('#'):
+                            if not os.path.exists(previous):
+                                header.append(line)
+                            continue
+                        #point paths in the scanned folder back to files_dir
+                        head = os.path.normcase(line[:len(delta_input) + 1].replace('/', os.sep))
+                        if head == input_prefix + os.sep:
+                            line = self.files_dir + os.sep + line[len(delta_input) + 1:]
+                        features.append(line)
+            
+            with open(previous + '.tmp', 'w', encoding='utf-8', errors='surrogateescape') as f:
+                f.writelines(header)
+                f.writelines(features)
+            os.replace(previous + '.tmp', previous)
+        
+        #histograms can't be combined the same way, so recount them from the combined feature files
+        for histogram, feature_file, feature in [('email_domain_histogram.txt', 'email.txt', lambda x: x.rsplit('@', 1)[-1].lower()), ('find_histogram.txt', 'find.txt', lambda x: x), ('telephone_histogram.txt', 'telephone.txt', lambda x: x)]:
+            feature_file = os.path.join(self.bulkext_dir, feature_file)
+            if not os.path.exists(feature_file):
+                continue
+            counts = Counter()
+            with open(feature_file, 'r', encoding='utf-8', errors='surrogateescape') as f:
+                for line in f:
+                    if not line.startswith('#'):
+                        fields = line.rstrip('\n').split('\t')
+                        if len(fields) > 1:
+                            counts[feature(fields[1])] += 1
+            with open(os.path.join(self.bulkext_dir, histogram), 'w', encoding='utf-8', errors='surrogateescape') as f:
+                for value, count in counts.most_common():
+                    f.write('n={}\t{}\n'.format(count, value))
+        
+        for folder in [delta_input, delta_output]:
+            if os.path.exists(folder):
+                shutil.rmtree(folder)
+        
+        #record event in PREMIS metadata
+        self.record_premis(timestamp, 'sensitive data scan', exitcode, bulkext_command, 'Scanned new and changed files for potentially sensitive information, including Social Security and credit card numbers; results for unchanged files were carried over from the previous scan.', be_ver)
+        
+        self.summarize_bulkext()
+        
+        print('\n\tSensitive data scan completed; moving on to next step...')
+        
+        return True
+    
+    def summarize_bulkext(self):
+        
         #create a cumulative BE report
         if os.path.exists(self.cumulative_be_report):
             os.remove(self.cumulative_be_report)
@@ -1390,15 +2670,21 @@ class DigitalObject(Shipment):
                         shutil.copy(current_file, self.reports_dir)
                 except OSError:
                     continue
-        
-        print('\n\tSensitive data scan completed; moving on to next step...')
     
-    def format_analysis(self):
+    def format_analysis(self, delta=None):
     
         print('\n\tFile format identification with Siegfried...') 
 
         format_version = subprocess.check_output('sf -version', shell=True, text=True).replace('\n', ' ')
         
+        #any results already in the siegfried database are out of date
+        if os.path.exists(self.sqlite_done):
+            os.remove(self.sqlite_done)
+        
+        #when re-analyzing, only identify new and changed files (see content_delta); if that fails, fall back on a full run
+        if delta is not None and os.path.exists(self.sf_file) and self.format_analysis_delta(delta, format_version):
+            return
+        
         #remove Siegrfried report if it already exists
         if os.path.exists(self.sf_file):
             os.remove(self.sf_file)                                                                 
@@ -1408,10 +2694,20 @@ class DigitalObject(Shipment):
         #create timestamp
         timestamp = str(datetime.datetime.now())
         
-        exitcode = subprocess.call(format_command, shell=True, text=True)
+        #pipe siegfried's output to us instead of a file: results are loaded into the siegfried database as siegfried produces them, and a copy is saved to siegfried.csv along the way
+        sf_proc = subprocess.Popen('sf -z -csv "{}"'.format(self.files_dir), shell=True, stdout=subprocess.PIPE)
+        with TeeReader(sf_proc.stdout, self.sf_file) as tee:
+            try:
+                self.load_siegfried(self.siegfried_reader(tee))
+            except (sqlite3.Error, csv.Error) as e:
+                #we still have siegfried.csv; import_csv will try again from that
+                print('\n\tUnable to load siegfried output into database: {}'.format(e))
+            finally:
+                tee.drain()
+        exitcode = sf_proc.wait()
         
         #if siegfried fails, then we'll run DROID
-        if exitcode != 0 and os.path.getsize(sf_file) == 0:
+        if exitcode != 0 and os.path.getsize(self.sf_file) == 0:
             print('\n\tFile format identification with siegfried failed; now attempting with DROID...\n') 
             
             format_version = "DROID v{}".format(subprocess.check_output('droid -v', shell=True, text=True).strip())
@@ -1427,155 +2723,256 @@ class DigitalObject(Shipment):
             #consolidate commands for premis
             format_command = "{} && {}".format(droid_cmd1, droid_cmd2)
             
-            #now reformat droid output to be like sf output
+            #now reformat droid output to be like sf output (and load it into the siegfried database)
             self.droid_to_siegfried()
         
         #record event in PREMIS metadata
         self.record_premis(timestamp, 'format identification', exitcode, format_command, 'Determined file format and version numbers for content using the PRONOM format registry.', format_version)
     
+    def format_analysis_delta(self, delta, format_version):
+        
+        timestamp = str(datetime.datetime.now())
+        format_commands = []
+        
+        #siegfried takes a list of files; keep each command well under the Windows command line limit
+        batches = [[]]
+        length = 0
+        for file in delta['rescan']:
+            if length + len(file) > 24000 and batches[-1]:
+                batches.append([])
+                length = 0
+            batches[-1].append(file)
+            length += len(file) + 3
+        
+        new_rows = []
+        header = None
+        batch_file = os.path.join(self.temp_dir, 'siegfried-delta.csv')
+        for batch in [b for b in batches if b]:
+            format_command = 'sf -z -csv {} > "{}"'.format(' '.join(['"{}"'.format(file) for file in batch]), batch_file)
+            exitcode = subprocess.call(format_command, shell=True, text=True)
+            if exitcode != 0:
+                print('\n\tFile format identification of new and changed files failed; identifying all files...')
+                return False
+            format_commands.append(format_command)
+            
+            with open(batch_file, 'r', encoding='utf8', newline='') as f:
+                reader = csv.reader(f)
+                header = next(reader, None)
+                new_rows.extend(reader)
+            os.remove(batch_file)
+        
+        #combine rows for unchanged (or renamed) files from the previous report with the new rows; rows for zip members ('file.zip#member') follow their zip file
+        merged = self.sf_file + '.tmp'
+        with open(self.sf_file, 'r', encoding='utf8', newline='') as f_in, open(merged, 'w', encoding='utf8', newline='') as f_out:
+            reader = csv.reader(f_in)
+            writer = csv.writer(f_out)
+            previous_header = next(reader, None)
+            writer.writerow(previous_header or header)
+            for row in reader:
+                if not row:
+                    continue
+                name = self.carry_over(row[0], delta, '#')
+                if name is not None:
+                    row[0] = name
+                    writer.writerow(row)
+            writer.writerows(new_rows)
+        os.replace(merged, self.sf_file)
+        
+        if format_commands:
+            format_command = ' && '.join(format_commands)
+        else:
+            format_command = 'sf (no new or changed files to identify)'
+        
+        #record event in PREMIS metadata
+        self.record_premis(timestamp, 'format identification', 0, format_command, 'Determined file format and version numbers for new and changed content using the PRONOM format registry; results for unchanged files were carried over from the previous analysis.', format_version)
+        
+        return True
+    
     def droid_to_siegfried(self):
-
-        counter = 0
-
+        
+        #converted rows are written to siegfried.csv and loaded into the siegfried database in the same pass
         with open(self.sf_file, 'w', newline='') as f1:
             csvWriter = csv.writer(f1)
-            header = ['filename', 'filesize', 'modified', 'errors', 'namespace', 'id', 'format', 'version', 'mime', 'basis', 'warning']
-            csvWriter.writerow(header)
-            with open(self.droid_out, 'r', encoding='utf8') as f2:
-                csvReader = csv.reader(f2)
-                next(csvReader)
-                for row in csvReader:
-                    counter+=1
-                    print('\rWorking on row {}'.format(counter), end='')
-                    
-                    if 'zip:file:' in row[2]:
-                        filename = row[2].split('zip:file:/', 1)[1].replace('.zip!', '.zip#').replace('/', '\\')
-                    else:
-                        filename = row[2].split('file:/', 1)[1]
-                    filename = unquote(filename)
-                    
-                    filesize = row[7]
-                    modified = row[10]
-                    errors = ''
-                    namespace = 'pronom'
-                    if row[14] == "":
-                        id = 'UNKNOWN'
-                    else:
-                        id = row[14]
-                    format = row[16]
-                    version = row[17]
-                    mime = row[15]
-                    basis = ''
-                    if row[11].lower() == 'true':
-                        warning = 'extension mismatch'
-                    else:
-                        warning = ''
-                    
-                    data = [filename, filesize, modified, errors, namespace, id, format, version, mime, basis, warning]
-                    
-                    csvWriter.writerow(data)
+            self.load_siegfried(self.droid_rows(csvWriter))
+    
+    def droid_rows(self, csvWriter):
+        
+        counter = 0
+        
+        header = ['filename', 'filesize', 'modified', 'errors', 'namespace', 'id', 'format', 'version', 'mime', 'basis', 'warning']
+        csvWriter.writerow(header)
+        yield header
+        
+        with open(self.droid_out, 'r', encoding='utf8') as f2:
+            csvReader = csv.reader(f2)
+            next(csvReader)
+            for row in csvReader:
+                counter+=1
+                print('\rWorking on row {}'.format(counter), end='')
+                
+                if 'zip:file:' in row[2]:
+                    filename = row[2].split('zip:file:/', 1)[1].replace('.zip!', '.zip#').replace('/', '\\')
+                else:
+                    filename = row[2].split('file:/', 1)[1]
+                filename = unquote(filename)
+                
+                filesize = row[7]
+                modified = row[10]
+                errors = ''
+                namespace = 'pronom'
+                if row[14] == "":
+                    id = 'UNKNOWN'
+                else:
+                    id = row[14]
+                format = row[16]
+                version = row[17]
+                mime = row[15]
+                basis = ''
+                if row[11].lower() == 'true':
+                    warning = 'extension mismatch'
+                else:
+                    warning = ''
+                
+                data = [filename, filesize, modified, errors, namespace, id, format, version, mime, basis, warning]
+                
+                csvWriter.writerow(data)
+                yield data
     
     def import_csv(self):
 
-        conn = sqlite3.connect(self.siegfried_db)
-        conn.text_factory = str  # allows utf-8 data to be stored
-        cursor = conn.cursor()
-
         print('\n\tImporting siegried file to sqlite3 database...')
         
         """Import csv file into sqlite db"""
-        f = open(self.sf_file, 'r', encoding='utf8')
+        with open(self.sf_file, 'r', encoding='utf8', errors='ignore') as f: # skip non-utf8 encodable characters
+            self.load_siegfried(csv.reader(x.replace('\0', '') for x in f)) # replace null bytes with empty strings on read
+    
+    def siegfried_reader(self, stream):
+        #csv reader for siegfried output read from a binary stream (e.g., a pipe); non-utf8 characters and null bytes are dropped, as in import_csv
+        return csv.reader(line.decode('utf8', errors='ignore').replace('\0', '') for line in stream)
+    
+    def load_siegfried(self, reader):
+        #(re)build the siegfried table from reader, which yields siegfried.csv-style rows (header first).  Used for siegfried.csv, siegfried's piped output, and converted DROID output
+        conn = sqlite3.connect(self.siegfried_db)
+        conn.text_factory = str  # allows utf-8 data to be stored
+        
+        #this database is just a working copy of siegfried's results (it's rebuilt whenever we re-analyze), so skip the rollback journal and waiting on the disk
+        conn.execute("PRAGMA journal_mode = OFF")
+        conn.execute("PRAGMA synchronous = OFF")
+        conn.execute("PRAGMA temp_store = MEMORY")
+        cursor = conn.cursor()
         
         try:
-            reader = csv.reader(x.replace('\0', '') for x in f) # replace null bytes with empty strings on read
-        except UnicodeDecodeError:
-            f = (x.strip() for x in f) # skip non-utf8 encodable characters
-            reader = csv.reader(x.replace('\0', '') for x in f) # replace null bytes with empty strings on read
-        header = True
-        for row in reader:
+            cursor.execute("DROP TABLE IF EXISTS siegfried")
+            cursor.execute("CREATE TABLE siegfried (filename text, filesize text, modified text, errors text, namespace text, id text, format text, version text, mime text, basis text, warning text)")
+            
+            # gather column names from first row
+            header = next(reader, None)
             if header:
-                header = False # gather column names from first row of csv
-                sql = "DROP TABLE IF EXISTS siegfried"
-                cursor.execute(sql)
-                sql = "CREATE TABLE siegfried (filename text, filesize text, modified text, errors text, namespace text, id text, format text, version text, mime text, basis text, warning text)"
-                cursor.execute(sql)
-                insertsql = "INSERT INTO siegfried VALUES ({})".format(", ".join([ "?" for column in row ]))
-                rowlen = len(row)
-            else:
-                # skip lines that don't have right number of columns
-                if len(row) == rowlen:
-                    cursor.execute(insertsql, row)
-        conn.commit()
-        f.close()
+                insertsql = "INSERT INTO siegfried VALUES ({})".format(", ".join([ "?" for column in header ]))
+                rowlen = len(header)
+                
+                # rows are handed to sqlite as they're read (so memory use doesn't grow with the number of files) and inserted in a single transaction; skip lines that don't have right number of columns
+                cursor.executemany(insertsql, (row for row in reader if len(row) == rowlen))
+            
+            #index the columns get_stats groups and filters on; building them once the rows are in is quicker than updating them on every insert.  siegfried_format also holds filesize and errors, so the grouped counts are read from the index alone
+            cursor.execute("CREATE INDEX siegfried_format ON siegfried (format, version, id, mime, filesize, errors)")
+            cursor.execute("CREATE INDEX siegfried_id ON siegfried (id)")
+            cursor.execute("CREATE INDEX siegfried_errors ON siegfried (errors)")
+            conn.commit()
+        finally:
+            cursor.close()
+            conn.close()
         
         #create file to indicate that this operation has completed
         open(self.sqlite_done, 'a').close()
-        
-        cursor.close()
-        conn.close()
     
-    def sqlite_to_csv(self, sql, path, header, cursor):
-        """Write sql query result to csv"""
-        report = open(path, 'w', newline='', encoding='utf8')
-
-        w = csv.writer(report, lineterminator='\n')
-        w.writerow(header)
-        for row in cursor.execute(sql):
-            w.writerow(row)
-        report.close()
+    def find_duplicates(self, file_stats):
+        #yield lists of file_stats dictionaries with the same checksum, in the order the files (and groups) first appear.  Files can only match if their sizes do, so we bucket by size first and only group by checksum within buckets with more than one file; each file is visited once.  Empty files (and files we don't have a checksum for) are skipped.  NOTE: the 'file_stats' list will be empty for DVDs, so nothing is yielded in that case
+        by_size = {}
+        for position, dctnry in enumerate(file_stats):
+            if dctnry['checksum'] and dctnry['size'] != '' and int(dctnry['size']) > 0:
+                by_size.setdefault(int(dctnry['size']), []).append((position, dctnry))
+        
+        groups = []
+        for bucket in by_size.values():
+            if len(bucket) < 2:
+                continue
+            by_checksum = {}
+            for position, dctnry in bucket:
+                by_checksum.setdefault(dctnry['checksum'], []).append((position, dctnry))
+            groups.extend([group for group in by_checksum.values() if len(group) > 1])
+        
+        #groups hold (position, dictionary) pairs, so the first position in each group is where it first appeared
+        groups.sort(key=lambda group: group[0][0])
+        for group in groups:
+            yield [dctnry for position, dctnry in group]
     
     def get_stats(self):
 
         print('\n\tGetting statistics and generating reports about content...')
         
-        #prepare sqlite database and variables
+        #tally format identification results and write the format reports.  One grouped query gets every count we need (the groups are then rolled up in memory), and one more picks out the rows for the unidentified and errors reports
         conn = sqlite3.connect(self.siegfried_db)
         conn.text_factory = str  # allows utf-8 data to be stored
-        cursor = conn.cursor()
         
-        full_header = ['Filename', 'Filesize', 'Date modified', 'Errors', 
-                    'Namespace', 'ID', 'Format', 'Format version', 'MIME type', 
-                    'Basis for ID', 'Warning']
-        
-        #retrieve our 'file stats'
-        file_stats = []
+        format_stats = SiegfriedStats(self.reports_dir)
         try:
-            with open(self.checksums, 'rb') as f:
-                file_stats = pickle.load(f)
-        except FileNotFoundError:
-            pass
+            for group in conn.execute("SELECT format, version, id, mime, COUNT(*), SUM(filesize = '0'), SUM(errors <> '') FROM siegfried GROUP BY format, version, id, mime"):
+                format_stats.add_group(*group)
+            #the union lets each half use its own index (an OR over two columns would scan the table); ordering by rowid keeps the rows in siegfried's order
+            for row in conn.execute("SELECT * FROM siegfried WHERE rowid IN (SELECT rowid FROM siegfried WHERE id = 'UNKNOWN' UNION SELECT rowid FROM siegfried WHERE errors > '') ORDER BY rowid"):
+                format_stats.list_row(row)
+        finally:
+            format_stats.close()
+            conn.close()
+        
+        self.num_files = format_stats.num_files
+        self.empty_files = format_stats.empty_files
+        self.unidentified_files = format_stats.unidentified_files
+        self.num_formats = format_stats.num_formats()
+        self.num_errors = format_stats.num_errors
+        
+        #add top formats to db['info']
+        self.db['info']['format_overview'] = format_stats.format_overview()
+        
+        #retrieve our 'file stats': from the digest store if we calculated them ourselves (files copied or extracted, or DVD titles), otherwise from the index of fiwalk's DFXML
+        if self.db.get('file_stats_dir'):
+            digest_store = self.open_digest_store()
+            file_stats = list(digest_store.records(self.db['file_stats_dir']))
+            digest_store.close()
+        else:
+            dfxml_index = self.open_dfxml_index()
+            file_stats = list(dfxml_index.file_stats())
+            dfxml_index.close()
         
-        # get total # of files
-        cursor.execute("SELECT COUNT(*) from siegfried;") # total files
-        self.num_files = cursor.fetchone()[0]
-
-        # get # of empty files
-        cursor.execute("SELECT COUNT(*) from siegfried where filesize='0';") # empty files
-        self.empty_files = cursor.fetchone()[0]
-            
         #Get stats on duplicates. Just in case the bdpl ingest tool crashes after compiling a duplicates list, we'll check to see if it already exists
-        if not 'dup_list' in list(self.db.keys()) or self.re_analyze:
-            self.db['dup_list'] = []
-
-            #next, create a new dictionary that IDs checksums that correspond to 1 or more files. NOTE: the 'file_stats' list will be empty for DVDs, so we'll skip this step in that case
-            if len(file_stats) > 1:
-                stat_dict = {}
-                for dctnry in file_stats:
-                    if int(dctnry['size']) > 0:
-                        if dctnry['checksum'] in stat_dict:
-                            stat_dict[dctnry['checksum']].append(dctnry['name'])
-                        else:
-                            stat_dict[dctnry['checksum']] = [dctnry['name']]
-               
-                #go through new dict and find checksums with duplicates
-                for chksm in [key for key, values in stat_dict.items() if len(values) > 1]:
-                    for fname in stat_dict[chksm]:
-                        temp = [item for item in file_stats if item['checksum'] == chksm and item['name'] == fname][0]
-                        self.db['dup_list'].append([temp['name'], temp['size'], temp['mtime'], temp['checksum']])
-                
+        if not 'dup_list' in self.db or self.re_analyze:
+            
+            #write each group of duplicates to the report as soon as it's found; the report is only kept if there are any duplicates
+            dup_list = []
+            with open(self.dup_report, 'w', newline='', encoding='utf-8') as f:
+                writer = csv.writer(f)
+                writer.writerow(['Filename', 'Filesize', 'Date modified', 'Checksum'])
+                for group in self.find_duplicates(file_stats):
+                    for dctnry in group:
+                        row = [dctnry['name'], dctnry['size'], dctnry['mtime'], dctnry['checksum']]
+                        writer.writerow(row)
+                        dup_list.append(row)
+            
+            if not dup_list:
+                os.remove(self.dup_report)
+            
             #save
+            self.db['dup_list'] = dup_list
             self.db.sync()
         
+        #duplicates found by an earlier run: make sure the report is there
+        elif self.db['dup_list'] and not os.path.exists(self.dup_report):
+            with open(self.dup_report, 'w', newline='', encoding='utf-8') as f:
+                writer = csv.writer(f)
+                writer.writerow(['Filename', 'Filesize', 'Date modified', 'Checksum'])
+                writer.writerows(self.db['dup_list'])
+        
         #total duplicates = total length of duplicate list
         self.all_dupes = len(self.db['dup_list'])
 
@@ -1589,58 +2986,11 @@ class DigitalObject(Shipment):
         distinct_files = int(self.num_files) - int(self.duplicate_copies)
         self.distinct_files = str(distinct_files)
         
-        # generate sorted format list report;
-        path = os.path.join(self.reports_dir, 'formats.csv')
-        sql = "SELECT format, id, COUNT(*) as 'num' FROM siegfried GROUP BY format ORDER BY num DESC"
-        format_header = ['Format', 'ID', 'Count']
-        self.sqlite_to_csv(sql, path, format_header, cursor)
-        
-        #add top formats to db['info']
-        fileformats = []
-        formatcount = 0
-        try:
-            with open(path, 'r') as csvfile:
-                formatreader = csv.reader(csvfile)
-                next(formatreader)
-                for row in formatreader:
-                    formatcount += 1
-                    fileformats.append(row[0])
-                fileformats = [element or 'Unidentified' for element in fileformats] # replace empty elements with 'Unidentified'
-                if formatcount > 0:
-                    self.db['info']['format_overview'] = "Top file formats (out of {} total) are: {}".format(formatcount, ' | '.join(fileformats[:10]))
-                else:
-                    self.db['info']['format_overview'] = "-"
-                
-        except IOError:
-            self.db['info']['format_overview'] = "ERROR! No formats.csv file to pull formats from."
-        
-        # generate sorted format and version list report
-        path = os.path.join(self.reports_dir, 'formatVersions.csv')
-        sql = "SELECT format, id, version, COUNT(*) as 'num' FROM siegfried GROUP BY format, version ORDER BY num DESC"
-        version_header = ['Format', 'ID', 'Version', 'Count']
-        self.sqlite_to_csv(sql, path, version_header, cursor)
-        
-        # get # of unidentified files and write list to CSV
-        cursor.execute("SELECT COUNT(*) FROM siegfried WHERE id='UNKNOWN';") # unidentified files
-        self.unidentified_files = cursor.fetchone()[0]
-        
-        sql = "SELECT * FROM siegfried WHERE id='UNKNOWN';"
-        path = os.path.join(self.reports_dir, 'unidentified.csv')
-        self.sqlite_to_csv(sql, path, full_header, cursor)
-        
-        # get sorted mimetype list report
-        path = os.path.join(self.reports_dir, 'mimetypes.csv')
-        sql = "SELECT mime, COUNT(*) as 'num' FROM siegfried GROUP BY mime ORDER BY num DESC"
-        mime_header = ['MIME type', 'Count']
-        self.sqlite_to_csv(sql, path, mime_header, cursor)
-        
         #for dvd jobs, we need to use disk image metadata for dates; for CDDA jobs, we can only list date as unknown
         if self.job_type == 'DVD':
-            try:
-                with open(self.checksums_dvd, 'rb') as f:
-                    file_stats = pickle.load(f)
-            except FileNotFoundError:
-                pass
+            dfxml_index = self.open_dfxml_index()
+            file_stats = list(dfxml_index.file_stats())
+            dfxml_index.close()
                 
         #For reporting purposes, we want to catch any files whose current 'mtime' was set during replication in the BDPL process.
 
@@ -1692,32 +3042,11 @@ class DigitalObject(Shipment):
                 for key, value in self.year_count.items():
                     writer.writerow([key, value])
 
-        # get number of identfied file formats
-        cursor.execute("SELECT COUNT(DISTINCT format) as formats from siegfried WHERE format <> '';")
-        self.num_formats = cursor.fetchone()[0]
-
-        # get number of siegfried errors and write errors to csv
-        cursor.execute("SELECT COUNT(*) FROM siegfried WHERE errors <> '';") # number of siegfried errors
-        self.num_errors = cursor.fetchone()[0]
-        
-        sql = "SELECT * FROM siegfried WHERE errors <> '';"
-        path = os.path.join(self.reports_dir, 'errors.csv')
-        self.sqlite_to_csv(sql, path, full_header, cursor)
-
-        # calculate size from recursive dirwalk and format
-        self.total_size_bytes = 0
-        for root, dirs, files in os.walk(self.files_dir):
-            for f in files:
-                file_path = os.path.join(root, f)
-                file_info = os.stat(file_path)
-                self.total_size_bytes += file_info.st_size
+        # calculate size from our folder inventory and format
+        self.total_size_bytes = self.inventory(self.files_dir).total_size()
 
         self.total_size = self.convert_size(self.total_size_bytes)
         
-        # close database connections
-        cursor.close()
-        conn.close()
-        
         #save information to db['info']     
         self.db['info'].update({'Source': self.identifier, 'begin_date': self.begin_date, 'end_date' : self.end_date, 'extent_normal': self.total_size, 'extent_raw': self.total_size_bytes, 'item_file_count': self.num_files, 'item_duplicate_count': self.distinct_dupes, 'FormatCount': self.num_formats, 'item_unidentified_count': self.unidentified_files})  
         
@@ -1773,307 +3102,152 @@ class DigitalObject(Shipment):
     
         print('\n\tCreating HTML...')
         
-        #set up html for report
-        html_doc = open(self.temp_html, 'w', encoding='utf8') 
-        
-        # write html
-        html_doc.write('<!DOCTYPE html>')
-        html_doc.write('\n<html lang="en">')
-        html_doc.write('\n<head>')
-        html_doc.write('\n<title>IUL Born Digital Preservation Lab report: {}</title>'.format(self.identifier))
-        html_doc.write('\n<meta http-equiv="Content-Type" content="text/html; charset=utf-8">')
-        html_doc.write('\n<meta name="description" content="HTML report based upon a template developed by Tim Walsh and distributed as part of Brunnhilde v. 1.7.2">')
-        html_doc.write('\n<link rel="stylesheet" href="./assets//css/bootstrap.min.css">')
-        html_doc.write('\n</head>')
-        html_doc.write('\n<body style="padding-top: 80px">')
-        # navbar
-        html_doc.write('\n<nav class="navbar navbar-expand-lg navbar-dark bg-dark fixed-top">')
-        html_doc.write('\n<a class="navbar-brand" href="#">Brunnhilde</a>')
-        html_doc.write('\n<button class="navbar-toggler" type="button" data-toggle="collapse" data-target="#navbarNavAltMarkup" aria-controls="navbarNavAltMarkup" aria-expanded="false" aria-label="Toggle navigation">')
-        html_doc.write('\n<span class="navbar-toggler-icon"></span>')
-        html_doc.write('\n</button>')
-        html_doc.write('\n<div class="collapse navbar-collapse" id="navbarNavAltMarkup">')
-        html_doc.write('\n<div class="navbar-nav">')
-        html_doc.write('\n<a class="nav-item nav-link" href="#Provenance">Provenance</a>')
-        html_doc.write('\n<a class="nav-item nav-link" href="#Stats">Statistics</a>')
-        html_doc.write('\n<a class="nav-item nav-link" href="#File formats">File formats</a>')
-        html_doc.write('\n<a class="nav-item nav-link" href="#File format versions">Versions</a>')
-        html_doc.write('\n<a class="nav-item nav-link" href="#MIME types">MIME types</a>')
-        html_doc.write('\n<a class="nav-item nav-link" href="#Last modified dates by year">Dates</a>')
-        html_doc.write('\n<a class="nav-item nav-link" href="#Unidentified">Unidentified</a>')
-        html_doc.write('\n<a class="nav-item nav-link" href="#Errors">Errors</a>')
-        html_doc.write('\n<a class="nav-item nav-link" href="#Duplicates">Duplicates</a>')
-        html_doc.write('\n<a class="nav-item nav-link" href="#Personally Identifiable Information (PII)">PII</a>')
-        html_doc.write('\n<a class="nav-item nav-link" href="#Named Entities">Named Entities</a>')
-        html_doc.write('\n</div>')
-        html_doc.write('\n</div>')
-        html_doc.write('\n</nav>')
-        # content
-        html_doc.write('\n<div class="container-fluid">')
-        html_doc.write('\n<h1 style="text-align: center; margin-bottom: 40px;">IUL BDPL Brunnhilde HTML report</h1>')
-        # provenance
-        html_doc.write('\n<a name="Provenance" style="padding-top: 40px;"></a>')
-        html_doc.write('\n<div class="container-fluid" style="margin-bottom: 40px;">')
-        html_doc.write('\n<div class="card">')
-        html_doc.write('\n<h2 class="card-header">Provenance</h2>')
-        html_doc.write('\n<div class="card-body">')
-        '''need to check if disk image or not'''
-        if self.job_type == 'Copy_only':
-            html_doc.write('\n<p><strong>Input source: File directory</strong></p>')
-        elif self.job_type == 'DVD':
-            html_doc.write('\n<p><strong>Input source: DVD-Video (optical disc)</strong></p>')
-        elif self.job_type == 'CDDA':
-            html_doc.write('\n<p><strong>Input source: Compact Disc Digital Audio (optical disc)</strong></p>')
-        elif self.job_type == 'Disk_image':
-            html_doc.write('\n<p><strong>Input source: Physical media: {}</strong></p>'.format(self.db['info'].get('content_source_type', 'Unidentified')))
-            
-        html_doc.write('\n<p><strong>Item identifier:</strong> {}</p>'.format(self.identifier))
-        html_doc.write('\n</div>')
-        html_doc.write('\n</div>')
-        html_doc.write('\n</div>')
-        # statistics
-        html_doc.write('\n<a name="Stats" style="padding-top: 40px;"></a>')
-        html_doc.write('\n<div class="container-fluid" style="margin-bottom: 40px;">')
-        html_doc.write('\n<div class="card">')
-        html_doc.write('\n<h2 class="card-header">Statistics</h2>')
-        html_doc.write('\n<div class="card-body">')
-        html_doc.write('\n<h4>Overview</h4>')
-        html_doc.write('\n<p><strong>Total files:</strong> {} (includes contents of archive files)</p>'.format(self.num_files))
-        html_doc.write('\n<p><strong>Total size:</strong> {}</p>'.format(self.total_size))
-        html_doc.write('\n<p><strong>Years (last modified):</strong> {} - {}</p>'.format(self.begin_date, self.end_date))
-        html_doc.write('\n<p><strong>Earliest date:</strong> {}</p>'.format(self.earliest_date))
-        html_doc.write('\n<p><strong>Latest date:</strong> {}</p>'.format(self.latest_date))
-        html_doc.write('\n<h4>File counts and contents</h4>')
-        html_doc.write('\n<p><em>Calculated by hash value. Empty files are not counted in first three categories. Total files = distinct + duplicate + empty files.</em></p>')
-        html_doc.write('\n<p><strong>Distinct files:</strong> {}</p>'.format(self.distinct_files))
-        html_doc.write('\n<p><strong>Distinct files with duplicates:</strong> {}</p>'.format(self.distinct_dupes))
-        html_doc.write('\n<p><strong>Duplicate files:</strong> {}</p>'.format(self.duplicate_copies))
-        html_doc.write('\n<p><strong>Empty files:</strong> {}</p>'.format(self.empty_files))
-        html_doc.write('\n<h4>Format identification</h4>')
-        html_doc.write('\n<p><strong>Identified file formats:</strong> {}</p>'.format(self.num_formats))
-        html_doc.write('\n<p><strong>Unidentified files:</strong> {}</p>'.format(self.unidentified_files))
-        html_doc.write('\n<h4>Errors</h4>')
-        html_doc.write('\n<p><strong>Siegfried errors:</strong> {}</p>'.format(self.num_errors))
-        html_doc.write('\n<h2>Virus scan report</h2>')
-        with open(self.virus_log, 'r', encoding='utf-8') as f:
-            virus_report = f.read().splitlines()
-        html_doc.write('\n<p>')
-        for line in virus_report:
-            html_doc.write('\n{}<br>'.format(line))
-        html_doc.write('\n</p>')
-        html_doc.write('\n</div>')
-        html_doc.write('\n</div>')
-        html_doc.write('\n</div>')
-        # detailed reports
-        html_doc.write('\n<div class="container-fluid" style="margin-bottom: 40px;">')
-        html_doc.write('\n<div class="card">')
-        html_doc.write('\n<h2 class="card-header">Detailed reports</h2>')
-        html_doc.write('\n<div class="card-body">')
-        
-        #now write reports to HTML
-        report_info = {
-            'File formats' : {'path' : os.path.join(self.reports_dir, 'formats.csv'), 'delimiter' : ','}, 
-            'File format versions' : {'path' : os.path.join(self.reports_dir, 'formatVersions.csv'), 'delimiter' : ','}, 
-            'MIME types' : {'path' : os.path.join(self.reports_dir, 'mimetypes.csv'), 'delimiter' : ','}, 
-            'Last modified dates by year' : {'path' : os.path.join(self.reports_dir, 'years.csv'), 'delimiter' : ','}, 
-            'Unidentified' : {'path' : os.path.join(self.reports_dir, 'unidentified.csv'), 'delimiter' : ','}, 
-            'Errors' : {'path' : os.path.join(self.reports_dir, 'errors.csv'), 'delimiter' : ','}, 
-            'Duplicates' : {'path' : ' ', 'delimiter' : ','}, 
-            'Personally Identifiable Information (PII)' : {'path' : self.cumulative_be_report, 'delimiter' : '\n'}}
-        
-        for header, info in report_info.items():
-            self.reports_to_html(header, info['path'], info['delimiter'], html_doc)
-        
-        #Add JavaScript and write html_doc closing tags
-        html_doc.write('\n</div>')
-        html_doc.write('\n</div>')
-        html_doc.write('\n</div>')
-        html_doc.write('\n</div>')
-        html_doc.write('\n<script src="./assets//js/jquery-3.3.1.slim.min.js"></script>')
-        html_doc.write('\n<script src="./assets//js/popper.min.js"></script>')
-        html_doc.write('\n<script src="./assets//js/bootstrap.min.js"></script>')
-        html_doc.write('\n<script>$(".navbar-nav .nav-link").on("click", function(){ $(".navbar-nav").find(".active").removeClass("active"); $(this).addClass("active"); });</script>')
-        html_doc.write('\n<script>$(".navbar-brand").on("click", function(){ $(".navbar-nav").find(".active").removeClass("active"); });</script>')
-        html_doc.write('\n</body>')
-        html_doc.write('\n</html>')
-        
-        # close HTML file
-        html_doc.close()
-
-        # write new html file, with hrefs for PRONOM IDs           
-        if os.path.exists(self.new_html):
-            os.remove(self.new_html)
-
-        # insert pronom links in HTML
-        in_file = open(self.temp_html, 'r', encoding='utf8')
-        out_file = open(self.new_html, 'w', encoding='utf8')
-
-        for line in in_file:
-            regex = r"fmt\/[0-9]+|x\-fmt\/[0-9]+" #regex to match fmt/# or x-fmt/#
-            pronom_links_to_replace = re.findall(regex, line)
-            new_line = line
-            for match in pronom_links_to_replace:
-                new_line = line.replace(match, "<a href=\"http://nationalarchives.gov.uk/PRONOM/" + 
-                        match + "\" target=\"_blank\">" + match + "</a>")
-                line = new_line # allow for more than one match per line
-            out_file.write(new_line)
-
-        in_file.close()
-        out_file.close()
+        #write html; the report replaces any earlier one once it's complete
+        with HtmlReport(self.new_html) as html_doc:
+            
+            #header and navbar
+            html_doc.write(html_doc.page_header.format(identifier=self.identifier))
+            
+            # provenance
+            html_doc.write('\n<a name="Provenance" style="padding-top: 40px;"></a>')
+            html_doc.write(html_doc.card_header.format(title='Provenance'))
+            '''need to check if disk image or not'''
+            if self.job_type == 'Copy_only':
+                html_doc.write('\n<p><strong>Input source: File directory</strong></p>')
+            elif self.job_type == 'DVD':
+                html_doc.write('\n<p><strong>Input source: DVD-Video (optical disc)</strong></p>')
+            elif self.job_type == 'CDDA':
+                html_doc.write('\n<p><strong>Input source: Compact Disc Digital Audio (optical disc)</strong></p>')
+            elif self.job_type == 'Disk_image':
+                html_doc.write('\n<p><strong>Input source: Physical media: {}</strong></p>'.format(self.db['info'].get('content_source_type', 'Unidentified')))
+                
+            html_doc.write('\n<p><strong>Item identifier:</strong> {}</p>'.format(self.identifier))
+            html_doc.write(html_doc.card_footer)
+            
+            # statistics
+            html_doc.write('\n<a name="Stats" style="padding-top: 40px;"></a>')
+            html_doc.write(html_doc.card_header.format(title='Statistics'))
+            html_doc.write('\n<h4>Overview</h4>')
+            html_doc.write('\n<p><strong>Total files:</strong> {} (includes contents of archive files)</p>'.format(self.num_files))
+            html_doc.write('\n<p><strong>Total size:</strong> {}</p>'.format(self.total_size))
+            html_doc.write('\n<p><strong>Years (last modified):</strong> {} - {}</p>'.format(self.begin_date, self.end_date))
+            html_doc.write('\n<p><strong>Earliest date:</strong> {}</p>'.format(self.earliest_date))
+            html_doc.write('\n<p><strong>Latest date:</strong> {}</p>'.format(self.latest_date))
+            html_doc.write('\n<h4>File counts and contents</h4>')
+            html_doc.write('\n<p><em>Calculated by hash value. Empty files are not counted in first three categories. Total files = distinct + duplicate + empty files.</em></p>')
+            html_doc.write('\n<p><strong>Distinct files:</strong> {}</p>'.format(self.distinct_files))
+            html_doc.write('\n<p><strong>Distinct files with duplicates:</strong> {}</p>'.format(self.distinct_dupes))
+            html_doc.write('\n<p><strong>Duplicate files:</strong> {}</p>'.format(self.duplicate_copies))
+            html_doc.write('\n<p><strong>Empty files:</strong> {}</p>'.format(self.empty_files))
+            html_doc.write('\n<h4>Format identification</h4>')
+            html_doc.write('\n<p><strong>Identified file formats:</strong> {}</p>'.format(self.num_formats))
+            html_doc.write('\n<p><strong>Unidentified files:</strong> {}</p>'.format(self.unidentified_files))
+            html_doc.write('\n<h4>Errors</h4>')
+            html_doc.write('\n<p><strong>Siegfried errors:</strong> {}</p>'.format(self.num_errors))
+            html_doc.write('\n<h2>Virus scan report</h2>')
+            html_doc.write('\n<p>')
+            with open(self.virus_log, 'r', encoding='utf-8') as f:
+                for line in f.read().splitlines():
+                    html_doc.write('\n{}<br>'.format(line))
+            html_doc.write('\n</p>')
+            html_doc.write(html_doc.card_footer)
+            
+            # detailed reports
+            html_doc.write(html_doc.card_header.format(title='Detailed reports'))
+            
+            #now write reports to HTML
+            report_info = {
+                'File formats' : {'path' : os.path.join(self.reports_dir, 'formats.csv'), 'delimiter' : ','}, 
+                'File format versions' : {'path' : os.path.join(self.reports_dir, 'formatVersions.csv'), 'delimiter' : ','}, 
+                'MIME types' : {'path' : os.path.join(self.reports_dir, 'mimetypes.csv'), 'delimiter' : ','}, 
+                'Last modified dates by year' : {'path' : os.path.join(self.reports_dir, 'years.csv'), 'delimiter' : ','}, 
+                'Unidentified' : {'path' : os.path.join(self.reports_dir, 'unidentified.csv'), 'delimiter' : ','}, 
+                'Errors' : {'path' : os.path.join(self.reports_dir, 'errors.csv'), 'delimiter' : ','}, 
+                'Duplicates' : {'path' : ' ', 'delimiter' : ','}, 
+                'Personally Identifiable Information (PII)' : {'path' : self.cumulative_be_report, 'delimiter' : '\n'}}
+            
+            for header, info in report_info.items():
+                self.reports_to_html(header, info['path'], info['delimiter'], html_doc)
+            
+            #Add JavaScript and write html_doc closing tags
+            html_doc.write(html_doc.page_footer)
     
     def reports_to_html(self, header, path, file_delimiter, html_doc):
         """Write csv file to html table"""
 
         # write header
-        html_doc.write('\n<a name="{}" style="padding-top: 40px;"></a>'.format(header))
-        html_doc.write('\n<h4>{}</h4>'.format(header))
+        html_doc.write(html_doc.section_header.format(header))
         
         if header == 'Duplicates':
             html_doc.write('\n<p><em>Duplicates are grouped by hash value.</em></p>')
             numline = len(self.db['dup_list'])
             
             if numline > 1: #aka more rows than just header
-                # read md5s from csv and write to list
-                hash_list = []
+                # group rows by hash in one pass, keeping hashes in the order they first appear
+                dup_groups = OrderedDict()
                 for row in self.db['dup_list']:
-                    hash_list.append(row[3])
-                # deduplicate md5_list
-                hash_list = list(OrderedDict.fromkeys(hash_list))
-                # for each hash in md5_list, print header, file info, and list of matching files
-                for hash_value in hash_list:
+                    dup_groups.setdefault(row[3], []).append(row)
+                # for each hash, print header, file info, and list of matching files
+                for hash_value, rows in dup_groups.items():
                     html_doc.write('\n<p>Files matching checksum <strong>{}</strong>:</p>'.format(hash_value))
-                    html_doc.write('\n<table class="table table-sm table-responsive table-bordered table-hover">')
-                    html_doc.write('\n<thead>')
-                    html_doc.write('\n<tr>')
-                    html_doc.write('\n<th>Filename</th><th>Filesize</th>')
-                    html_doc.write('<th>Date modified</th>')
-                    html_doc.write('<th>Checksum</th>')
-                    html_doc.write('\n</tr>')
-                    html_doc.write('\n</thead>')
-                    html_doc.write('\n<tbody>')
-                    for row in self.db['dup_list']:
-                        if row[3] == hash_value:
-                            # write data
-                            html_doc.write('\n<tr>')
-                            for column in row:
-                                html_doc.write('\n<td>' + str(column) + '</td>')
-                            html_doc.write('\n</tr>')
-                    html_doc.write('\n</tbody>')
-                    html_doc.write('\n</table>')
-            
-                #save a copy of the duplicates for the reports
-                dup_report = os.path.join(self.reports_dir, 'duplicates.csv')
-                with open(dup_report, "w", newline="", encoding='utf-8') as f:
-                    writer = csv.writer(f)
-                    dup_header = ['Filename', 'Filesize', 'Date modified', 'Checksum']
-                    writer.writerow(dup_header)
-                    for item in self.db['dup_list']:
-                        writer.writerow(item)
+                    html_doc.table('\n<th>Filename</th><th>Filesize</th><th>Date modified</th><th>Checksum</th>', rows, bordered=True)
             else:
                 html_doc.write('\nNone found.\n<br><br>')
+        
+        # if writing PII, handle separately
+        elif header == 'Personally Identifiable Information (PII)':
+            html_doc.write('\n<p><em>Potential PII in source, as identified by bulk_extractor.</em></p>')  
+            pii_list = []
             
-        else:
             if not os.path.exists(path):
                 open(path, 'w').close()
-                
-            in_file = open(path, 'r', encoding="utf-8")
-            # count lines and then return to start of file
-            numline = len(in_file.readlines())
-            in_file.seek(0)
 
-            #open csv reader
-            r = csv.reader(in_file, delimiter="{}".format(file_delimiter))
+            #check that there are any PII results.  Set value to begin; we will add any found values
+            self.db['info']['pii_scan_results'] = '-'
+            
+            if os.stat(path).st_size > 0:
+                #bulk_extractor feature file -> (description, more information, pii_scan_results label)
+                pii_types = [('pii.txt', 'SSNs, Account Nos., Birth Dates, etc.', 'Use BE_Viewer to verify results; report.xml file located at: {}.'.format(self.bulkext_dir), 'ACCOUNT NOs'), 
+                    ('ccn.txt', 'Credit Card Nos.', 'Use BE_Viewer to verify results; report.xml file located at: {}.'.format(self.bulkext_dir), 'CCNs'), 
+                    ('email.txt', 'Email address domains (may include 3rd party information)', 'See: <a href="./email_domain_histogram.txt">Email domain histogram</a>', 'EMAIL'), 
+                    ('telephone.txt', 'Telephone numbers (may include 3rd party information)', 'See: <a href="./telephone_histogram.txt">Telephone # histogram</a>', 'TELEPHONE NOs'), 
+                    ('find.txt', 'Sensitive terms and phrases', 'See: <a href="./find_histogram.txt">Keyword histogram</a>', 'TERMS')]
+                
+                rows = []
+                with open(path, 'r') as pii_info:
+                    for line in pii_info:
+                        columns = []
+                        for feature_file, description, more_info, label in pii_types:
+                            if feature_file in line:
+                                columns.extend([description, line.split()[1], more_info])
+                                pii_list.append(label)
+                        rows.append(columns)
+                html_doc.table(['PII type', '# of matches (may be false)', 'More information (if available)'], rows)
+                
+                if len(pii_list) > 0:
+                    self.db['info']['pii_scan_results'] = '{}.'.format(', '.join(pii_list))
+        
+            else:
+                html_doc.write('\nNone found.')
             
-            # if writing PII, handle separately
-            if header == 'Personally Identifiable Information (PII)':
-                html_doc.write('\n<p><em>Potential PII in source, as identified by bulk_extractor.</em></p>')  
-                pii_list = []
+            self.db.sync()
 
-                #check that there are any PII results.  Set value to begin; we will add any found values
-                self.db['info']['pii_scan_results'] = '-'
-                
-                if os.stat(path).st_size > 0:
-                    html_doc.write('\n<table class="table table-sm table-responsive table-hover">')
-                    html_doc.write('\n<thead>')
-                    html_doc.write('\n<tr>')
-                    html_doc.write('\n<th>PII type</th>')
-                    html_doc.write('\n<th># of matches (may be false)</th>')
-                    html_doc.write('\n<th>More information (if available)</th>')
-                    html_doc.write('\n</tr>')
-                    html_doc.write('\n</thead>')
-                    html_doc.write('\n<tbody>')
-                    with open(path, 'r') as pii_info:
-                        for line in pii_info:
-                            html_doc.write('\n<tr>')
-                            if 'pii.txt' in line:
-                                # write data
-                                html_doc.write('\n<td>SSNs, Account Nos., Birth Dates, etc.</td>')
-                                html_doc.write('\n<td>' + line.split()[1] + '</td>')
-                                html_doc.write('\n<td>Use BE_Viewer to verify results; report.xml file located at: {}.</td>'.format(self.bulkext_dir))
-                                pii_list.append('ACCOUNT NOs')
-                            if 'ccn.txt' in line:
-                                html_doc.write('\n<td>Credit Card Nos.</td>')
-                                html_doc.write('\n<td>' + line.split()[1] + '</td>')
-                                html_doc.write('\n<td>Use BE_Viewer to verify results; report.xml file located at: {}.</td>'.format(self.bulkext_dir))
-                                pii_list.append('CCNs')
-                            if 'email.txt' in line:
-                                html_doc.write('\n<td>Email address domains (may include 3rd party information)</td>')
-                                html_doc.write('\n<td>' + line.split()[1] + '</td>')
-                                html_doc.write('\n<td>See: <a href="./email_domain_histogram.txt">Email domain histogram</a></td>')
-                                pii_list.append('EMAIL')
-                            if 'telephone.txt' in line:
-                                html_doc.write('\n<td>Telephone numbers (may include 3rd party information)</td>')
-                                html_doc.write('\n<td>' + line.split()[1] + '</td>')
-                                html_doc.write('\n<td>See: <a href="./telephone_histogram.txt">Telephone # histogram</a></td>')
-                                pii_list.append('TELEPHONE NOs')
-                            if 'find.txt' in line:
-                                html_doc.write('\n<td>Sensitive terms and phrases</td>')
-                                html_doc.write('\n<td>' + line.split()[1] + '</td>')
-                                html_doc.write('\n<td>See: <a href="./find_histogram.txt">Keyword histogram</a></td>')
-                                pii_list.append('TERMS')
-                            html_doc.write('\n</tr>')   
-                    html_doc.write('\n</tbody>')
-                    html_doc.write('\n</table>')
-                    
-                    if len(pii_list) > 0:
-                        self.db['info']['pii_scan_results'] = '{}.'.format(', '.join(pii_list))
+        # otherwise write as normal
+        else:
+            if not os.path.exists(path):
+                open(path, 'w').close()
             
-                else:
-                    html_doc.write('\nNone found.')
+            with open(path, 'r', encoding="utf-8") as in_file:
+                r = csv.reader(in_file, delimiter="{}".format(file_delimiter))
+                row1 = next(r, None)
+                row2 = next(r, None)
                 
-                self.db.sync()
-
-            # otherwise write as normal
-            else:
-                if numline > 1: #aka more rows than just header
+                if row2 is not None: #aka more rows than just header
                     # add borders to table for full-width tables only
                     full_width_table_headers = ['Unidentified', 'Errors']
-                    if header in full_width_table_headers:
-                        html_doc.write('\n<table class="table table-sm table-responsive table-bordered table-hover">')
-                    else:
-                        html_doc.write('\n<table class="table table-sm table-responsive table-hover">')
-                    # write header row
-                    html_doc.write('\n<thead>')
-                    html_doc.write('\n<tr>')
-                    row1 = next(r)
-                    for column in row1:
-                        html_doc.write('\n<th>' + str(column) + '</th>')
-                    html_doc.write('\n</tr>')
-                    html_doc.write('\n</thead>')
-                    # write data rows
-                    html_doc.write('\n<tbody>')
-                    for row in r:
-                        # write data
-                        html_doc.write('\n<tr>')
-                        for column in row:
-                            html_doc.write('\n<td>' + str(column) + '</td>')
-                        html_doc.write('\n</tr>')
-                    html_doc.write('\n</tbody>')
-                    html_doc.write('\n</table>')
+                    html_doc.table(row1, itertools.chain([row2], r), bordered=header in full_width_table_headers)
                 else:
                     html_doc.write('\nNone found.\n<br><br>')
-        
-            in_file.close()
     
     def print_premis(self):   
         
@@ -2242,12 +3416,129 @@ class DigitalObject(Shipment):
                 else:
                     return False
 
+    def inventory(self, folder):
+        #return a listing of folder, reusing (and refreshing) one we've already built if possible
+        folder = os.path.normpath(folder)
+        if folder in self.inventories:
+            self.inventories[folder].refresh()
+        else:
+            self.inventories[folder] = ItemInventory(folder)
+        return self.inventories[folder]
+
+    def open_digest_store(self):
+        return DigestStore(self.item_index_db, self.barcode_dir, self.digest_algorithms)
+    
+    def content_delta(self):
+        #compare the files now in files_dir with those in the previous DFXML so that re-analysis only has to rescan new and changed files.  Files are joined on path, then (for paths that have disappeared) on MD5, to spot renames.  Returns None if there's no DFXML of files_dir to compare with.
+        root = os.path.normpath(self.files_dir)
+        if not os.path.exists(self.dfxml_output) or not os.path.isdir(root):
+            return None
+        
+        print('\n\nIDENTIFYING CHANGES SINCE LAST ANALYSIS')
+        
+        previous = {}
+        def collect(batch):
+            for fi in batch:
+                name = fi.filename()
+                if name and os.path.normpath(name).startswith(root + os.sep):
+                    previous[os.path.relpath(name, root)] = fi.hashdigest.get('md5')
+        try:
+            with open(self.dfxml_output, 'rb') as f:
+                dfxml.read_dfxml_batches(f, ['filename', 'md5'], collect)
+        except xml.parsers.expat.ExpatError:
+            print('\n\tUnable to read DFXML; all files will be analyzed.')
+            return None
+        
+        #DFXML from fiwalk (disk images) describes the file system, not files_dir
+        if not previous:
+            return None
+        
+        #current MD5s; only new or modified files need to be hashed (and the digests are stored, so DFXML creation will reuse them)
+        inventory = self.inventory(root)
+        engine = ChecksumEngine(algorithms=self.digest_algorithms)
+        digest_store = self.open_digest_store()
+        
+        def current_digest(path):
+            st = os.stat(path)
+            digests = digest_store.lookup(path, st)
+            if digests is None:
+                digests, size = engine.digest_file(path)
+                return (path, st, digests, True)
+            return (path, st, digests, False)
+        
+        current = OrderedDict()
+        for path, st, digests, new in engine.imap(current_digest, inventory.paths()):
+            if new:
+                digest_store.record(path, st, digests)
+            current[os.path.relpath(path, root)] = digests['md5']
+        digest_store.close()
+        
+        #join on path...
+        unchanged = [p for p in current if p in previous and previous[p] == current[p]]
+        changed = [p for p in current if p in previous and previous[p] != current[p]]
+        added = [p for p in current if not p in previous]
+        missing = [p for p in previous if not p in current]
+        
+        #...then on digest: a new path with the same content as a path that's gone is a rename
+        missing_by_digest = {}
+        for p in missing:
+            missing_by_digest.setdefault(previous[p], []).append(p)
+        renamed = OrderedDict()
+        new = []
+        for p in added:
+            if missing_by_digest.get(current[p]):
+                renamed[missing_by_digest[current[p]].pop(0)] = p
+            else:
+                new.append(p)
+        deleted = [p for p in missing if not p in renamed]
+        
+        print('\n\t{} new, {} changed, {} renamed, {} deleted, and {} unchanged files.'.format(len(new), len(changed), len(renamed), len(deleted), len(unchanged)))
+        
+        #'keep' maps paths in the previous reports (relative to files_dir) to their current paths; 'rescan' lists the files tools need to look at
+        keep = OrderedDict((p, p) for p in unchanged)
+        keep.update(renamed)
+        rescan_paths = set(new + changed)
+        rescan = [os.path.join(root, p) for p in current if p in rescan_paths]
+        
+        return {'root' : root, 'keep' : keep, 'rescan' : rescan, 'new' : new, 'changed' : changed, 'renamed' : renamed, 'deleted' : deleted}
+    
+    def carry_over(self, name, delta, separators=''):
+        #for an entry about NAME in a report from the previous analysis, return the name to use now, or None if the file has since changed or been removed.  Entries about part of a file (e.g., a zip member, 'file.zip#member') follow that file; separators lists the characters that can follow a file's path in such entries.
+        prefix = delta['root'] + os.sep
+        if name.startswith(prefix):
+            rel = name[len(prefix):]
+        else:
+            prefix = ''
+            rel = name
+        
+        owner = None
+        if rel in delta['keep']:
+            owner = rel
+        else:
+            for i in range(len(rel) - 1, 0, -1):
+                if rel[i] in separators and rel[:i] in delta['keep']:
+                    owner = rel[:i]
+                    break
+        
+        if owner is None:
+            return None
+        return prefix + delta['keep'][owner] + rel[len(owner):]
+    
+    def open_dfxml_index(self):
+        #(re)build the index if it doesn't reflect the current DFXML (e.g., an item started before we kept one)
+        dfxml_index = DfxmlIndex(self.item_index_db)
+        if not dfxml_index.is_current(self.dfxml_output):
+            if os.path.exists(self.dfxml_output):
+                print('\n\tIndexing DFXML...')
+                dfxml_index.build(self.dfxml_output)
+            else:
+                dfxml_index.clear()
+        return dfxml_index
+    
     def md5(self, fname):
-        hash_md5 = hashlib.md5()
-        with open(fname, "rb") as f:
-            for chunk in iter(lambda: f.read(4096), b""):
-                hash_md5.update(chunk)
-        return hash_md5.hexdigest()
+        #large files will be memory-mapped; others are read in large chunks
+        digests, size = ChecksumEngine(workers=1).digest_file(fname)
+        return digests['md5']
 
     def convert_size(self, size):
         # convert size to human-readable form
@@ -2268,16 +3559,7 @@ class DigitalObject(Shipment):
             return False
         
         #make sure there are files in the 'files' directory
-        for dirpath, dirnames, contents in os.walk(some_dir):
-            for file in contents:
-                if os.path.isfile(os.path.join(dirpath, file)):
-                    #return True as soon as a file is found
-                    return True
-                else: 
-                    continue
-        
-        #if no files found, return false
-        return False
+        return self.inventory(some_dir).has_files()
         
     def mount_iso(self):
         print('\nMOUNTING .ISO DISK IMAGE FILE...')
@@ -2347,12 +3629,17 @@ class DigitalObject(Shipment):
         
     def run_item_analysis(self):
         
+        '''when re-analyzing, find out which files are new or have changed since the last analysis, so that only those need to be rescanned'''
+        delta = None
+        if self.re_analyze:
+            delta = self.content_delta()
+        
         '''run antivirus'''
         print('\nVIRUS SCAN: clamscan.exe')
         if self.check_premis('virus check') and not self.re_analyze:
             print('\n\tVirus scan already completed; moving on to next step...')
         else:
-            self.run_antivirus()
+            self.run_antivirus(delta)
     
         '''create DFXML (if not already done so)'''
         if self.check_premis('message digest calculation') and not self.re_analyze:
@@ -2390,7 +3677,7 @@ class DigitalObject(Shipment):
             print('\n\tSensitive data scan already completed; moving on to next step...')
         else:
             if self.job_type in ['Copy_only', 'Disk_image']:
-                self.run_bulkext()
+                self.run_bulkext(delta)
             else:
                 print('\n\tSensitive data scan not required for DVD-Video or CDDA content; moving on to next step...')
                 
@@ -2399,10 +3686,10 @@ class DigitalObject(Shipment):
         if self.check_premis('format identification') and not self.re_analyze:
             print('\n\tFile format analysis already completed; moving on to next operation...')
         else:
-            self.format_analysis()
+            self.format_analysis(delta)
         
-        #load siegfried.csv into sqlite database; skip if it's already completed
-        if not os.path.exists(self.sqlite_done) or self.re_analyze:
+        #load siegfried.csv into sqlite database, unless siegfried's results were loaded as they were produced (or an earlier run already did this); format_analysis removes sqlite_done when results change
+        if not os.path.exists(self.sqlite_done):
             self.import_csv() # load csv into sqlite db
         
         '''generate statistics/reports'''
@@ -3220,6 +4507,31 @@ class RipstationBatch(Shipment):
         
         pass
         
+class BagitTags:
+    '''
+    The bagit helpers SdaBatchDeposit.make_bag needs to write a bag's tag files itself.  bagit.py doesn't make these public, so every use of its private functions goes through here.  Written against bagit 1.9.0; if a later release renames or changes them, this is the only place to update.  A missing helper raises bagit.BagError, so the item fails like any other bagging error.
+    '''
+    @staticmethod
+    def _private(name):
+        func = getattr(bagit, name, None)
+        if func is None:
+            raise bagit.BagError('bagit.py v{} has no {}(); BagitTags needs updating'.format(bagit.VERSION, name))
+        return func
+    
+    @staticmethod
+    def encode_filename(path):
+        #encode a payload path for manifest-<alg>.txt
+        return BagitTags._private('_encode_filename')(path)
+    
+    @staticmethod
+    def write_bag_info(bag_info_path, bag_info):
+        BagitTags._private('_make_tag_file')(bag_info_path, bag_info)
+    
+    @staticmethod
+    def write_tagmanifest(alg, bag_dir, encoding='utf-8'):
+        #checksum the tag files already in bag_dir
+        BagitTags._private('_make_tagmanifest_file')(alg, bag_dir, encoding=encoding)
+
 class SdaBatchDeposit(Shipment):
     def __init__(self, controller):
         Shipment.__init__(self, controller)
@@ -3588,8 +4900,8 @@ class SdaBatchDeposit(Shipment):
                         shutil.rmtree(current_item.temp_dir)
                     
                     try:
-                        #create bag
-                        bagit.make_bag(current_item.barcode_dir, {"Source-Organization" : current_item.unit_name, "External-Description" : self.sda_status_db['item_stats'][current_item.identifier]['bag_description'], "External-Identifier" : current_item.identifier}, checksums=["md5"])
+                        #create bag; manifest draws on digests already calculated for the item
+                        self.make_bag(current_item, {"Source-Organization" : current_item.unit_name, "External-Description" : self.sda_status_db['item_stats'][current_item.identifier]['bag_description'], "External-Identifier" : current_item.identifier})
                         
                         print('\tBagging complete.')
                         
@@ -3614,19 +4926,15 @@ class SdaBatchDeposit(Shipment):
                     #first check available space
                     (total_space, used_space, free_space) = shutil.disk_usage(os.getcwd())
                     
-                    #now get size of barcode_dir
-                    cmd = 'du -s {}'.format(current_item.barcode_dir)
-                    
-                    output = subprocess.run(cmd, shell=True, text=True, capture_output=True)
-                    
-                    dir_size = int(output.stdout.split()[0])
+                    #now get size of barcode_dir (in bytes, to match free_space)
+                    dir_size = current_item.inventory(current_item.barcode_dir).total_size()
                     
                     #check if the new archive will have sufficient space on disk; include addition 10240 bytes for tar file. Ff so, continue.  If not, exit with a warning
                     available_space = int(free_space) - (dir_size * 2 + 10240)
                     
                     #fail item if not enough space to create tar
                     if available_space <= 0:
-                        print('\n\tWARNING! Insufficient space to create tar archive.\n\t\tAvailable space: %s\n\t\tSize needed for archive: %s' % (free_space, string(dir_size)))
+                        print('\n\tWARNING! Insufficient space to create tar archive.\n\t\tAvailable space: %s\n\t\tSize needed for archive: %s' % (free_space, str(dir_size)))
                         
                         self.write_db('failed', current_item.identifier, 'Insufficient space\t need minimum of {} bytes'.format(dir_size))
                         
@@ -3642,8 +4950,14 @@ class SdaBatchDeposit(Shipment):
                     print('\n\tCreating tar archive...')
                     
                     try:
-                        with tarfile.open(current_item.tar_file, "w") as tar:
-                            tar.add(current_item.barcode_dir, arcname=current_item.identifier)
+                        #calculate the SIP's checksums and size as the tar is written, so we don't have to read it again
+                        with HashingWriter(current_item.tar_file, current_item.digest_algorithms) as writer:
+                            with tarfile.open(fileobj=writer, mode="w", copybufsize=4194304) as tar:
+                                tar.add(current_item.barcode_dir, arcname=current_item.identifier)
+                        
+                        digest_store = current_item.open_digest_store()
+                        digest_store.record(current_item.tar_file, os.stat(current_item.tar_file), writer.digests())
+                        digest_store.close()
                             
                         print('\tTar archive created')
                         
@@ -3665,9 +4979,11 @@ class SdaBatchDeposit(Shipment):
                     
                     #get some stats on SIP and store values in self.sda_status_db['item_stats'][current_item.identifier]
                     print('\tGenerating SIP statistics...')
-                    self.sda_status_db['item_stats'][current_item.identifier]['sip_extent'] = current_item.get_size(current_item.tar_file)
+                    sip_digests, sip_extent = self.sip_digests(current_item)
                     
-                    self.sda_status_db['item_stats'][current_item.identifier]['sip_md5'] = current_item.md5(current_item.tar_file)
+                    self.sda_status_db['item_stats'][current_item.identifier]['sip_extent'] = sip_extent
+                    
+                    self.sda_status_db['item_stats'][current_item.identifier]['sip_md5'] = sip_digests['md5']
                     
                     self.sda_status_db['item_stats'][current_item.identifier]['sip_filename'] = os.path.basename(current_item.tar_file)
                     
@@ -3865,6 +5181,93 @@ class SdaBatchDeposit(Shipment):
         
         print('\nCurrent session for shipment {}{} completed!!'.format(current_item.unit_name, current_item.shipment_date))
     
+    def make_bag(self, current_item, bag_info):
+        '''
+        Equivalent to bagit.make_bag(..., checksums=["md5"]), but payload checksums are pulled from the item's digest store wherever the file is unchanged since produce_dfxml; only files without a stored digest (disk images, reports, etc.) are read.
+        '''
+        bag_dir = current_item.barcode_dir
+        digest_store = current_item.open_digest_store()
+        engine = ChecksumEngine(algorithms=current_item.digest_algorithms)
+        
+        #get payload files
+        payload = sorted(current_item.inventory(bag_dir).paths())
+        
+        #check digest store first (sqlite connection stays on this thread); only files without a usable digest are read
+        manifest = []
+        missing = []
+        for path in payload:
+            st = os.stat(path)
+            digests = digest_store.lookup(path, st)
+            if digests is None:
+                missing.append((path, st))
+            else:
+                manifest.append((digests['md5'], path, st.st_size))
+        reused = len(manifest)
+        
+        def calculate(item):
+            path, st = item
+            digests, size = engine.digest_file(path)
+            return (path, st, digests)
+        
+        for path, st, digests in engine.imap(calculate, missing):
+            digest_store.record(path, st, digests)
+            manifest.append((digests['md5'], path, st.st_size))
+        
+        print('\t{} of {} payload checksums reused from earlier analysis.'.format(reused, len(manifest)))
+        
+        #move payload into 'data' directory and update keys in digest store
+        temp_data = tempfile.mkdtemp(dir=bag_dir)
+        for f in os.listdir(bag_dir):
+            old_f = os.path.join(bag_dir, f)
+            if old_f == temp_data:
+                continue
+            os.rename(old_f, os.path.join(temp_data, f))
+        data_dir = os.path.join(bag_dir, 'data')
+        os.rename(temp_data, data_dir)
+        os.chmod(data_dir, os.stat(bag_dir).st_mode)
+        for f in os.listdir(data_dir):
+            digest_store.rekey(os.path.join(bag_dir, f), os.path.join(data_dir, f))
+        digest_store.close()
+        
+        #write tag files
+        total_bytes = 0
+        with open(os.path.join(bag_dir, 'manifest-md5.txt'), 'w', encoding='utf-8', newline='\n') as f:
+            for checksum, path, size in manifest:
+                rel_path = 'data/{}'.format(os.path.relpath(path, bag_dir).replace('\\', '/'))
+                f.write('{}  {}\n'.format(checksum, BagitTags.encode_filename(rel_path)))
+                total_bytes += size
+        
+        with open(os.path.join(bag_dir, 'bagit.txt'), 'w', encoding='utf-8', newline='\n') as f:
+            f.write('BagIt-Version: 0.97\nTag-File-Character-Encoding: UTF-8\n')
+        
+        bag_info['Bagging-Date'] = datetime.date.today().strftime('%Y-%m-%d')
+        bag_info['Bag-Software-Agent'] = 'bagit.py v{} <{}>'.format(bagit.VERSION, bagit.PROJECT_URL)
+        bag_info['Payload-Oxum'] = '{}.{}'.format(total_bytes, len(manifest))
+        BagitTags.write_bag_info(os.path.join(bag_dir, 'bag-info.txt'), bag_info)
+        
+        BagitTags.write_tagmanifest('md5', bag_dir, encoding='utf-8')
+        
+        #confirm structure and that every payload file is in the manifest (and vice versa) without re-reading content
+        bag = bagit.Bag(bag_dir)
+        bag.validate(completeness_only=True)
+        
+        return bag
+    
+    def sip_digests(self, current_item):
+        #get digests and extent for the SIP; these are normally recorded while the tar is written, so we only need to read the tar if it has changed since then
+        digest_store = current_item.open_digest_store()
+        
+        st = os.stat(current_item.tar_file)
+        digests = digest_store.lookup(current_item.tar_file, st)
+        if digests is None:
+            engine = ChecksumEngine(workers=1, algorithms=current_item.digest_algorithms)
+            digests, size = engine.digest_file(current_item.tar_file, progress=True)
+            digest_store.record(current_item.tar_file, st, digests)
+            
+        digest_store.close()
+        
+        return (digests, st.st_size)
+    
     def write_db(self, db, identifier, message=None):
     
         if db in self.db_dicts:
@@ -3894,6 +5297,9 @@ class SdaBatchDeposit(Shipment):
         #set up variable to help track success of operation
         success = True
         
+        #index siegfried.csv by filename the first time we need it, rather than reading through it for every file
+        sf_index = None
+        
         for file in files_to_be_separated:
             
             #check if we've already separated file; if so, continue
@@ -3921,13 +5327,20 @@ class SdaBatchDeposit(Shipment):
                 else:
                     type = 'extracted-file'
                 
-                    with open(current_item.sf_file, 'r', encoding='utf8') as f:
-                        csvreader = csv.reader(f)
-                        for row in csvreader:
-                            if file in row[0]:
-                                size = row[1]
-                                last_mod_date = row[2]
-                                puid = row[5]
+                    if sf_index is None:
+                        sf_index = {}
+                        with open(current_item.sf_file, 'r', encoding='utf8') as f:
+                            for row in csv.reader(f):
+                                sf_index.setdefault(os.path.normpath(row[0]), (row[1], row[2], row[5]))
+                    
+                    #siegfried lists full paths; file is relative to our working directory (the shipment folder)
+                    if os.path.abspath(file) in sf_index:
+                        size, last_mod_date, puid = sf_index[os.path.abspath(file)]
+                    else:
+                        #fall back on a partial match
+                        for name, info in sf_index.items():
+                            if file in name:
+                                size, last_mod_date, puid = info
                                 break
             
             #now move item; we've had some permission issues in the past--try to catch those
@@ -34,6 +34,14 @@ import dfxml
 import os
 import sys
 import platform
+import collections
+import mmap
+
+#lxml is optional; it lets iterrecords() filter fileobject elements in the parser itself.
+try:
+    from lxml import etree as _lxml_etree
+except ImportError:
+    _lxml_etree = None
 
 _logger = logging.getLogger(os.path.basename(__file__))
 
@@ -872,6 +880,9 @@ class HiveObject(object):
 
 class ByteRun(object):
 
+    #Byte runs are created by the thousands for fragmented files; slots keep each one small.
+    __slots__ = ("_img_offset", "_fs_offset", "_file_offset", "_fill", "_len")
+
     _all_properties = set([
       "img_offset",
       "fs_offset",
@@ -1021,8 +1032,13 @@ class ByteRuns(object):
     #http://www.rafekettler.com/magicmethods.html
     #http://stackoverflow.com/a/8841520
 
+    __slots__ = ("_facet", "_listdata")
+
     _facet_values = [None, "data", "inode", "name"]
 
+    #Image file extensions that iter_contents() reads directly, rather than through img_cat.
+    _raw_image_extensions = [".dd", ".raw", ".img", ".iso"]
+
     def __init__(self, run_list=None, **kwargs):
         self._facet = kwargs.get("facet")
         self._listdata = []
@@ -1103,15 +1119,115 @@ class ByteRuns(object):
             else:
                 self._listdata[-1] = maybe_new_run
         
-    def iter_contents(self, raw_image, buffer_size=1048576, sector_size=512, errlog=None, statlog=None):
+    def _coalesced_runs(self):
+        """
+        Returns a list of (img_offset, len, fill) tuples for the runs in this list, with runs that are adjacent in the image joined so they can be read in one pass.  Fill runs have an img_offset of None.
+        """
+        spans = []
+        for run in self:
+            if run.len is None:
+                raise AttributeError("Byte runs can't be extracted if a run length is undefined.")
+
+            if not run.fill is None and len(run.fill) > 0:
+                spans.append((None, run.len, run.fill))
+                continue
+
+            if run.img_offset is None:
+                raise AttributeError("Byte runs can't be extracted if missing a fill character and image offset.")
+
+            if len(spans) > 0 and spans[-1][2] is None and spans[-1][0] + spans[-1][1] == run.img_offset:
+                spans[-1] = (spans[-1][0], spans[-1][1] + run.len, None)
+            else:
+                spans.append((run.img_offset, run.len, None))
+        return spans
+
+    def _iter_contents_native(self, raw_image, buffer_size=1048576, statlog=None, use_mmap=False, views=False):
         """
-        Generator.  Yields contents, as byte strings one block at a time, given a backing raw image path.  Relies on The SleuthKit's img_cat, so contents can be extracted from any disk image type that TSK supports.
-        @param buffer_size The maximum size of the byte strings yielded.
+        Generator.  Yields contents as byte strings, reading the raw image directly with os.pread (or seek and read where pread isn't available).
+        @param use_mmap True to memory-map the image instead (falling back on reads if it can't be mapped).  Off by default: on Windows, a read error on a mapped view (failing or removable media) kills the interpreter instead of raising an exception.
+        @param views True to yield memoryviews instead of byte strings.  With use_mmap, blocks are then slices of the map rather than copies.
+        """
+        spans = self._coalesced_runs()
+        status = "1"
+
+        #One block per fill value; fill runs are yielded as slices of it.
+        fill_blocks = {}
+
+        with open(raw_image, "rb", buffering=0) as fh:
+            image_size = os.fstat(fh.fileno()).st_size
+            mapped = None
+            if use_mmap and image_size > 0:
+                try:
+                    mapped = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+                except (OSError, ValueError):
+                    mapped = None
+            try:
+                for (offset, length, fill) in spans:
+                    if offset is None:
+                        block = fill_blocks.get(fill)
+                        if block is None:
+                            #Repeat multi-byte fill characters from the start of each block, as img_cat extraction did.
+                            block = (fill * (buffer_size // len(fill) + 1))[:buffer_size]
+                            if views:
+                                block = memoryview(block)
+                            fill_blocks[fill] = block
+                        len_to_read = length
+                        while len_to_read > 0:
+                            yield block[:min(len_to_read, buffer_size)]
+                            len_to_read -= buffer_size
+                        continue
+
+                    end = offset + length
+                    if end > image_size:
+                        raise ValueError("Byte run at image offset %d (length %d) extends past the end of the image (%d bytes)." % (offset, length, image_size))
+
+                    while offset < end:
+                        read_size = min(end - offset, buffer_size)
+                        if not mapped is None:
+                            if views:
+                                yield memoryview(mapped)[offset:offset + read_size]
+                            else:
+                                yield mapped[offset:offset + read_size]
+                        else:
+                            if hasattr(os, "pread"):
+                                buffer_data = os.pread(fh.fileno(), read_size, offset)
+                            else:
+                                fh.seek(offset)
+                                buffer_data = fh.read(read_size)
+                            yield memoryview(buffer_data) if views else buffer_data
+                        offset += read_size
+                status = "0"
+            finally:
+                if not mapped is None:
+                    try:
+                        mapped.close()
+                    except BufferError:
+                        #The caller still holds some of our slices; the map is released along with them.
+                        pass
+                if not statlog is None:
+                    with open(statlog, "w") as status_fh:
+                        status_fh.write(status)
+
+    def iter_contents(self, raw_image, buffer_size=1048576, sector_size=512, errlog=None, statlog=None, native=None, use_mmap=False, views=False):
+        """
+        Generator.  Yields contents as byte strings, one block at a time, given a backing image path.  Raw images are read directly, coalescing runs that are adjacent in the image (see _iter_contents_native).  Other images are read with The SleuthKit's img_cat, so contents can be extracted from any disk image type that TSK supports.
+        @param buffer_size The maximum size of the blocks yielded.
         @param sector_size The size of a disk sector in the raw image.  Required by img_cat.
+        @param native True to read the image directly, False to use img_cat.  By default, images with an extension in ByteRuns._raw_image_extensions are read directly.
+        @param use_mmap True to memory-map raw images that are read directly.  Only use this for images on local fixed disks.
+        @param views True to yield memoryviews rather than byte strings for raw images that are read directly.
         """
         if not isinstance(raw_image, str):
             raise TypeError("iter_contents needs the string path to the image file.  Received: %r." % raw_image)
 
+        if native is None:
+            native = os.path.splitext(raw_image)[1].lower() in ByteRuns._raw_image_extensions
+
+        if native:
+            for chunk in self._iter_contents_native(raw_image, buffer_size, statlog, use_mmap, views):
+                yield chunk
+            return
+
         stderr_fh = None
         if not errlog is None:
             stderr_fh = open(errlog, "wb")
@@ -1233,6 +1349,8 @@ class TimestampObject(object):
     TimestampObjects implement a vs-null comparison workaround as in the SAS family of products:  Null, for ordering purposes, is considered to be a value less than negative infinity.
     """
 
+    __slots__ = ("_name", "_prec", "_time", "_timestamp")
+
     timestamp_name_list = ["mtime", "atime", "ctime", "crtime", "dtime", "bkup_time"]
 
     def __init__(self, *args, **kwargs):
@@ -1407,6 +1525,49 @@ class FileObject(object):
         fi.mtime
     """
 
+    #A fiwalk DFXML can yield millions of FileObjects, so storage is declared up front rather than kept in a per-instance __dict__.  Properties store their values in the underscored slots; the rest of _all_properties are plain attributes.
+    __slots__ = (
+      "_alloc",
+      "_alloc_inode",
+      "_alloc_name",
+      "_annos",
+      "_atime",
+      "_bkup_time",
+      "_compressed",
+      "_crtime",
+      "_ctime",
+      "_data_brs",
+      "_diffs",
+      "_dtime",
+      "_error",
+      "_filesize",
+      "_gid",
+      "_id",
+      "_inode",
+      "_inode_brs",
+      "_libmagic",
+      "_meta_type",
+      "_mode",
+      "_mtime",
+      "_name_brs",
+      "_name_type",
+      "_nlink",
+      "_original_fileobject",
+      "_orphan",
+      "_parent_object",
+      "_partition",
+      "_seq",
+      "_uid",
+      "_unalloc",
+      "_unused",
+      "_used",
+      "_volume_object",
+      "filename",
+      "link_target",
+      "md5",
+      "sha1"
+    )
+
     _all_properties = set([
       "alloc",
       "alloc_inode",
@@ -1478,8 +1639,9 @@ class FileObject(object):
             if prop == "annos":
                 continue
             setattr(self, prop, kwargs.get(prop))
-        self._annos = set()
-        self._diffs = set()
+        #The annotation and diff sets are rarely used, so they're only created when first accessed
+        self._annos = None
+        self._diffs = None
 
     def __eq__(self, other):
         if other is None:
@@ -1538,7 +1700,7 @@ class FileObject(object):
         Generator.  Extracts the facet with a SleuthKit tool, yielding chunks of the data.
         @param buffer_size The facet data is yielded in chunks of at most this parameter's size. Default 1MiB.
         @param partition_offset The offset of the file's containing partition, in bytes.  Needed for icat.  If not given, the FileObject's VolumeObject will be used.  If that's also absent, icat can't be used, and img_cat will instead be tried as a fallback (which means byte runs must be in the DFXML).
-        @param icat_threshold icat incurs extensive, non-sequential IO overhead to walk the filesystem to reach the facet's byte runs.  img_cat can be called on each byte run reported in the DFXML file, but on fragmented files this incurs overhead in process spawning.  Facets larger than this threshold are extracted with icat.  Default 256MiB.  Force icat by setting this to -1; force img_cat with infinity (float("inf")).
+        @param icat_threshold icat incurs extensive, non-sequential IO overhead to walk the filesystem to reach the facet's byte runs.  img_cat can be called on each byte run reported in the DFXML file, but on fragmented files this incurs overhead in process spawning.  Facets larger than this threshold are extracted with icat.  Default 256MiB.  Force icat by setting this to -1; force img_cat with infinity (float("inf")).  (The icat path is currently disabled; raw images are read directly by ByteRuns.iter_contents, which avoids both costs.)
         """
 
         _image_path = image_path
@@ -1623,7 +1785,8 @@ class FileObject(object):
 
         #Map "delta:" attributes of <fileobject>s into the self.annos set
         #_logger.debug("self.annos, before: %r." % self.annos)
-        _read_differential_annotations(FileObject._diff_attr_names, e, self.annos)
+        if e.attrib:
+            _read_differential_annotations(FileObject._diff_attr_names, e, self.annos)
         #_logger.debug("self.annos, after: %r." % self.annos)
 
         #Look through direct-child elements for other properties
@@ -1917,6 +2080,8 @@ class FileObject(object):
     @property
     def annos(self):
         """Set of differential annotations.  Expected members are the keys of this class's _diff_attr_names dictionary."""
+        if self._annos is None:
+            self._annos = set()
         return self._annos
 
     @annos.setter
@@ -2011,6 +2176,8 @@ class FileObject(object):
     @property
     def diffs(self):
         """This property intentionally has no setter.  To populate, call compare_to_original() after assigning an original_fileobject."""
+        if self._diffs is None:
+            self._diffs = set()
         return self._diffs
 
     @property
@@ -2691,6 +2858,81 @@ def iterparse(filename, events=("start","end"), dfxmlobject=None):
             raise e
         _logger.debug("...Done.")
 
+#FileObject properties that are stored as text in DFXML, and so can be requested from iterrecords().  Hashes are taken from <hashdigest type="..."> elements.
+_record_fields = (FileObject._all_properties - set(["annos", "byte_runs", "data_brs", "inode_brs", "name_brs", "original_fileobject", "parent_object"])) | set(["sha256"])
+_record_types = {}
+
+def iterrecords(filename, fields):
+    """
+    Generator.  A fast alternative to iterparse() for callers that only need a few properties of each file: yields one namedtuple per fileobject, with an attribute for each name in fields.
+    Values are the raw text of the DFXML elements (or None where absent); none of the FileObject property casting or validation is done, and no byte run or timestamp objects are built.  Only FileObjects are reported, and filename must be a DFXML file (or a file object reading one).
+    @param filename: A string or file object
+    @param fields: A sequence of FileObject property names, e.g. ("filename", "name_type", "mtime", "crtime").
+    """
+    fields = tuple(fields)
+    for field in fields:
+        if not field in _record_fields:
+            raise ValueError("Unexpected record field: %r.  Expecting one of: %r." % (field, sorted(_record_fields)))
+
+    if not fields in _record_types:
+        _record_types[fields] = collections.namedtuple("FileRecord", fields)
+    record_type = _record_types[fields]
+
+    index = dict((field, i) for (i, field) in enumerate(fields))
+    width = len(fields)
+    hash_fields = set(["md5", "sha1", "sha256"])
+
+    if _lxml_etree is not None:
+        #Have lxml report only the elements we need, so we don't pay for Python proxies of every child element
+        tags = set(["{*}fileobject"])
+        for field in fields:
+            tags.add("{*}hashdigest" if field in hash_fields else "{*}" + field)
+
+        values = [None] * width
+        for (ETevent, elem) in _lxml_etree.iterparse(filename, events=("end",), tag=tags):
+            tag = elem.tag
+            tag = tag[tag.rfind("}")+1:]
+            if tag == "fileobject":
+                yield record_type._make(values)
+                values = [None] * width
+
+                #Free the element and the already-processed siblings
+                elem.clear()
+                while elem.getprevious() is not None:
+                    del elem.getparent()[0]
+            else:
+                #Only take direct children of the fileobject (not, e.g., the inode of a parent_object)
+                parent_tag = elem.getparent().tag
+                if parent_tag[parent_tag.rfind("}")+1:] != "fileobject":
+                    continue
+                if tag == "hashdigest":
+                    tag = elem.get("type", "").lower()
+                i = index.get(tag)
+                if not i is None:
+                    values[i] = elem.text
+        return
+
+    for (ETevent, elem) in ET.iterparse(filename, events=("end",)):
+        tag = elem.tag
+        if tag != "fileobject" and not tag.endswith("}fileobject"):
+            continue
+
+        values = [None] * width
+        for ce in elem:
+            ctag = ce.tag
+            #Skip comments and processing instructions
+            if not isinstance(ctag, str):
+                continue
+            if ctag[0] == "{":
+                ctag = ctag[ctag.rfind("}")+1:]
+            if ctag == "hashdigest":
+                ctag = ce.get("type", "").lower()
+            i = index.get(ctag)
+            if not i is None:
+                values[i] = ce.text
+        yield record_type._make(values)
+        elem.clear()
+
 def parse(filename):
     """Returns a DFXMLObject populated from the contents of the (string) filename argument."""
     retval = None
@@ -2710,9 +2952,86 @@ def parse(filename):
                 appender.append(obj)
     return retval
 
+def _benchmark_memory(count=100000):
+    """Reports the average number of bytes held by a FileObject populated from a typical fiwalk fileobject element (dfxml.benchmark_fileobject)."""
+    import tracemalloc
+
+    #Build the elements first, so only the FileObjects are measured
+    elements = [ET.fromstring(dfxml.benchmark_fileobject(i)) for i in range(count)]
+
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    objects = []
+    for e in elements:
+        fi = FileObject()
+        fi.populate_from_Element(e)
+        objects.append(fi)
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    return (after - before) / count
+
+def _benchmark_records(count=100000, fields=("filename", "name_type", "mtime", "crtime")):
+    """Times iterparse() against iterrecords() on a generated fiwalk-style DFXML file.  Returns (iterparse seconds, iterrecords seconds)."""
+    import tempfile
+    import time
+
+    with tempfile.NamedTemporaryFile(suffix=".xml", delete=False) as fh:
+        path = fh.name
+
+    try:
+        dfxml.write_benchmark_dfxml(path, count)
+
+        start = time.time()
+        objects = 0
+        for (event, obj) in iterparse(path):
+            if isinstance(obj, FileObject):
+                objects += 1
+        iterparse_time = time.time() - start
+
+        start = time.time()
+        records = 0
+        for record in iterrecords(path, fields):
+            records += 1
+        iterrecords_time = time.time() - start
+    finally:
+        os.remove(path)
+
+    assert objects == records == count
+    return (iterparse_time, iterrecords_time)
+
+def _benchmark_timestamps(count=100000, distinct=5000):
+    """Times building TimestampObjects from fiwalk-style timestamp strings (COUNT strings, DISTINCT values 2 seconds apart), first with the regular-expression parser dfxml used to have and then with the current one.  Returns (regex seconds, current seconds)."""
+    import time
+
+    base = time.mktime((2009, 11, 12, 18, 31, 38, 0, 0, -1))
+    values = [dfxml.timestamp2iso8601(base + 2 * (i % distinct)) for i in range(count)]
+
+    #Swap the old parser back in
+    (fast_datetime, fast_mktime) = (dfxml.iso8601Tdatetime, dfxml.iso8601Tmktime)
+    dfxml.iso8601Tdatetime = dfxml.iso8601Tdatetime_regex
+    dfxml.iso8601Tmktime = lambda s: time.mktime(dfxml.iso8601Tdatetime_regex(s).timetuple())
+    try:
+        start = time.time()
+        old = [TimestampObject(v, name="mtime").timestamp for v in values]
+        regex_time = time.time() - start
+    finally:
+        (dfxml.iso8601Tdatetime, dfxml.iso8601Tmktime) = (fast_datetime, fast_mktime)
+
+    dfxml.iso8601Tdatetime.cache_clear()
+    dfxml.iso8601Tmktime.cache_clear()
+    start = time.time()
+    new = [TimestampObject(v, name="mtime").timestamp for v in values]
+    current_time = time.time() - start
+
+    assert old == new
+    return (regex_time, current_time)
+
 if __name__ == "__main__":
     import argparse
     parser = argparse.ArgumentParser()
+    parser.add_argument("--benchmark", action="store_true", help="Also report the memory used per FileObject, compare iterparse() with iterrecords(), and time timestamp parsing.")
+    args = parser.parse_args()
     
     logging.basicConfig(level=logging.DEBUG)
     #Run unit tests
@@ -2749,4 +3068,57 @@ if __name__ == "__main__":
     assert t1.prec[0] == 2
     assert t1.prec[1] == "s"
 
-    print("Unit tests passed.")
\ No newline at end of file
+    print("Unit tests passed.")
+
+    #Check record mode against the full parser
+    _records_xml = b"""<dfxml xmlns="http://www.forensicswiki.org/wiki/Category:Digital_Forensics_XML"><volume><fileobject><filename>a.txt</filename><name_type>r</name_type><mtime>2009-01-23T01:23:45Z</mtime><hashdigest type="md5">abc</hashdigest></fileobject><fileobject><filename>b</filename><name_type>d</name_type></fileobject></volume></dfxml>"""
+    import io
+    _records = list(iterrecords(io.BytesIO(_records_xml), ["filename", "name_type", "mtime", "crtime", "md5"]))
+    assert len(_records) == 2
+    assert _records[0] == ("a.txt", "r", "2009-01-23T01:23:45Z", None, "abc")
+    assert _records[1].filename == "b" and _records[1].mtime is None
+    try:
+        list(iterrecords(io.BytesIO(_records_xml), ["byte_runs"]))
+        assert False
+    except ValueError:
+        pass
+    print("Record mode tests passed.")
+
+    #Check direct extraction from a raw image
+    import tempfile
+    with tempfile.NamedTemporaryFile(suffix=".dd", delete=False) as _image_fh:
+        _image_fh.write(bytes(range(256)) * 16)
+        _image_path = _image_fh.name
+    try:
+        _brs = ByteRuns()
+        _brs.append(ByteRun(img_offset=512, len=100))
+        _brs.append(ByteRun(img_offset=612, len=412))
+        _brs.append(ByteRun(len=5, fill=b"\x00"))
+        _brs.append(ByteRun(img_offset=3000, len=96))
+        assert _brs._coalesced_runs() == [(512, 512, None), (None, 5, b"\x00"), (3000, 96, None)]
+        _expected = (bytes(range(256)) * 16)[512:1024] + b"\x00" * 5 + (bytes(range(256)) * 16)[3000:3096]
+        _chunks = list(_brs.iter_contents(_image_path, buffer_size=64))
+        assert all(isinstance(chunk, bytes) and len(chunk) <= 64 for chunk in _chunks)
+        assert b"".join(_chunks) == _expected
+        for _use_mmap in [False, True]:
+            _chunks = list(_brs.iter_contents(_image_path, buffer_size=64, use_mmap=_use_mmap, views=True))
+            assert all(isinstance(chunk, memoryview) and len(chunk) <= 64 for chunk in _chunks)
+            assert b"".join(_chunks) == _expected
+            assert b"".join(_brs.iter_contents(_image_path, buffer_size=64, use_mmap=_use_mmap)) == _expected
+        del _chunks
+        _brs.append(ByteRun(img_offset=4000, len=200))
+        try:
+            b"".join(_brs.iter_contents(_image_path))
+            assert False
+        except ValueError:
+            pass
+    finally:
+        os.remove(_image_path)
+    print("Byte run extraction tests passed.")
+
+    if args.benchmark:
+        print("Memory per FileObject: %.0f bytes." % _benchmark_memory())
+        (iterparse_time, iterrecords_time) = _benchmark_records()
+        print("100000 fileobjects: iterparse() %.2fs, iterrecords() %.2fs (%.1fx faster)." % (iterparse_time, iterrecords_time, iterparse_time / iterrecords_time))
+        (regex_time, current_time) = _benchmark_timestamps()
+        print("100000 TimestampObjects: regex parsing %.2fs, sliced and cached parsing %.2fs (%.1fx faster)." % (regex_time, current_time, regex_time / current_time))
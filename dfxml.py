@@ -40,6 +40,8 @@ import re
 from sys import stderr
 from subprocess import Popen,PIPE
 import base64
+import bisect
+import functools
 import hashlib
 import os
 
@@ -88,6 +90,12 @@ class GMTMIN(tzinfo):
     def tzname(self,dt):
          return "GMT+%02d%02d" % (self.minoffset/60,self.minoffset%60)
 
+@functools.lru_cache(maxsize=None)
+def gmtmin(minoffset):
+    """Returns a shared GMTMIN for MINOFFSET; there are only a handful of
+    offsets in any DFXML file, so there is no need for one per timestamp."""
+    return GMTMIN(minoffset)
+
 def parse_iso8601(ts):
     Z = ts.find('Z')
     if Z>0:
@@ -96,7 +104,37 @@ def parse_iso8601(ts):
 
 
 rx_iso8601 = re.compile("(\d\d\d\d)-(\d\d)-(\d\d)[T ](\d\d):(\d\d):(\d\d)(\.\d+)?(Z|[-+]\d\d:?\d\d)?")
+
+# Number of distinct timestamp strings to remember; see iso8601Tdatetime.
+ISO8601_CACHE_SIZE = 65536
+
+@functools.lru_cache(maxsize=ISO8601_CACHE_SIZE)
 def iso8601Tdatetime(s):
+    """Converts ISO8601 to datetime.
+    The form fiwalk writes, YYYY-MM-DDTHH:MM:SSZ, is checked at fixed
+    offsets and the date and time are sliced off and handed to the C parser
+    in datetime.fromisoformat; anything else (or anything fromisoformat
+    rejects) goes through iso8601Tdatetime_regex.  The
+    results are the same either way.  Large DFXML files repeat the same
+    times over and over (FAT only records to 2 seconds, and whole folders
+    are often copied at once), so results are memoized.  datetimes are
+    immutable, so sharing them is safe."""
+    if len(s)==20 and s[4]=="-" and s[7]=="-" and s[10] in "T " and s[13]==":" and s[16]==":" and s[19]=="Z":
+        try:
+            return datetime.datetime.fromisoformat(s[:19])
+        except ValueError:
+            pass
+    return iso8601Tdatetime_regex(s)
+
+@functools.lru_cache(maxsize=ISO8601_CACHE_SIZE)
+def iso8601Tmktime(s):
+    """Returns time.mktime() of iso8601Tdatetime(s), memoized the same way.
+    (mktime uses the local time zone, which is fixed for the life of the
+    process.)"""
+    import time
+    return time.mktime(iso8601Tdatetime(s).timetuple())
+
+def iso8601Tdatetime_regex(s):
     """SLG's conversion of ISO8601 to datetime"""
     m = rx_iso8601.search(s)
     if not m:
@@ -121,11 +159,11 @@ def iso8601Tdatetime(s):
     if minoffset:
         return datetime.datetime(int(m.group(1)),int(m.group(2)),int(m.group(3)),
                                  int(m.group(4)),int(m.group(5)),int(m.group(6)),
-                                 microseconds,GMTMIN(minoffset))
+                                 microseconds,gmtmin(minoffset))
     elif offset:
         return datetime.datetime(int(m.group(1)),int(m.group(2)),int(m.group(3)),
                                  int(m.group(4)),int(m.group(5)),int(m.group(6)),
-                                 microseconds,GMTMIN(offset))
+                                 microseconds,gmtmin(offset))
     else:
         return datetime.datetime(int(m.group(1)),int(m.group(2)),int(m.group(3)),
                                  int(m.group(4)),int(m.group(5)),int(m.group(6)),
@@ -175,7 +213,7 @@ def rfc822Tdatetime(s):
           int(mgd["minutes"]),
           int(mgd["seconds"]),
           0,
-          GMTMIN(minoffset)
+          gmtmin(minoffset)
         )
     else:
         return datetime.datetime(
@@ -293,6 +331,8 @@ class ComparableMixin(object):
     http://regebro.wordpress.com/2010/12/13/python-implementing-rich-comparison-the-correct-way/
     http://stackoverflow.com/questions/6907323/comparable-classes-in-python-3/6913420#6913420
     """
+    __slots__ = ()
+
     def _compare(self, other, method):
         try:
             return method(self._cmpkey(), other._cmpkey())
@@ -322,6 +362,9 @@ class ComparableMixin(object):
 class dftime(ComparableMixin):
     """Represents a DFXML time. Automatically converts between representations and caches the
     results as necessary.."""
+    #Every Objects.TimestampObject holds one of these; slots keep them small.  Unset representations raise AttributeError, as the caching below expects.
+    __slots__ = ("iso8601_", "datetime_", "timestamp_")
+
     UTC = GMTMIN(0)
 
     def ts2datetime(self,ts):
@@ -411,7 +454,7 @@ class dftime(ComparableMixin):
             return self.timestamp_
         except AttributeError:
             self.datetime_ = iso8601Tdatetime(self.iso8601_)
-            self.timestamp_ = time.mktime(self.datetime_.timetuple())
+            self.timestamp_ = iso8601Tmktime(self.iso8601_)
             return self.timestamp_
         
     def datetime(self):
@@ -1270,6 +1313,95 @@ class fileobject_reader(xml_reader):
         if name in ['image_filename','imagefile'] and self.tagstack[-1]=='source':
             self.imageobject._tags['image_filename'] = self.cdata
 
+class filtered_fileobject_reader(xml_reader):
+    """Class which uses the SAX expat-based XML reader, for callers that
+    only need some of each fileobject's tags.  Text is collected only for
+    the requested tags (direct children of <fileobject>), and fileobject_sax
+    objects are passed to the callback in lists of up to batch_size, so
+    there are far fewer calls back into Python than with fileobject_reader.
+    Request hash algorithms (e.g. "md5") like tags; request "byte_runs" to
+    also get fi.byte_runs().  Volume and image information is not read."""
+    def __init__(self,tags,imagefile=None,batch_size=1000,buffer_size=65536):
+        self.tags         = set(tags)
+        self.text_tags    = self.tags - set(["byte_runs"])
+        self.want_runs    = "byte_runs" in self.tags
+        self.imagefile    = imagefile
+        self.batch_size   = batch_size
+        self.buffer_size  = buffer_size
+        self.fileobject   = None
+        self.depth        = 0           # depth within the current fileobject; 0 when outside one
+        self.batch        = []
+        self.hashdigest_type = None
+        xml_reader.__init__(self)
+
+    def _char_data(self, data):
+        """Handles XML data; only installed while inside a requested tag"""
+        self.cdata += data
+
+    def _start_element(self, name, attrs):
+        """ Handles the start of an element for the XPAT scanner"""
+        if self.fileobject is None:
+            if name=="fileobject":
+                self.fileobject = fileobject_sax(imagefile=self.imagefile)
+                self.depth = 1
+            return
+        self.depth += 1
+        if self.depth==2:
+            if name=="hashdigest":
+                alg = attrs.get("type","").lower()
+                if alg not in self.text_tags:
+                    return
+                self.hashdigest_type = alg
+            elif name not in self.text_tags:
+                return
+            self.cdata = ""
+            self.parser.CharacterDataHandler = self._char_data
+            return
+        if self.want_runs and self.depth==3 and (name=="run" or name=="byte_run"):
+            b = byte_run()
+            b.decode_sax_attributes(attrs)
+            self.fileobject._byte_runs.append(b)
+
+    def _end_element(self, name):
+        """Handles the end of an element for the XPAT scanner"""
+        if self.fileobject is None:
+            return
+        if self.depth==2 and self.cdata is not None:
+            self.parser.CharacterDataHandler = None
+            if name=="hashdigest":
+                self.fileobject._tags[self.hashdigest_type] = self.cdata # legacy
+                self.fileobject.hashdigest[self.hashdigest_type] = self.cdata
+            else:
+                self.fileobject._tags[name] = self.cdata
+            self.cdata = None
+        self.depth -= 1
+        if self.depth==0:
+            self.batch.append(self.fileobject)
+            self.fileobject = None
+            if len(self.batch) >= self.batch_size:
+                self.callback(self.batch)
+                self.batch = []
+
+    def process_xml_stream(self,xml_stream,callback,preserve_fis=False):
+        "Run the reader on a given XML input stream, reading buffer_size bytes at a time"
+        self.callback = callback
+        import xml.parsers.expat
+        p = xml.parsers.expat.ParserCreate()
+        p.buffer_text = True
+        p.buffer_size = self.buffer_size
+        p.StartElementHandler  = self._start_element
+        p.EndElementHandler    = self._end_element
+        self.parser = p
+        while True:
+            data = xml_stream.read(self.buffer_size)
+            if not data:
+                break
+            p.Parse(data, False)
+        p.Parse(b"", True)
+        if self.batch:
+            self.callback(self.batch)
+            self.batch = []
+
 class volumeobject_reader(xml_reader):
     """Reads just the <volume> section of a DFXML file"""
     def __init__(self):
@@ -1359,46 +1491,53 @@ def combine_runs(runs):
 
 class extentdb:
     """A class to a database of extents and report if they collide.
-    Currently this is not an efficient implementation, but it could become
-    more efficient in the future. When it does, every program that uses
-    this implementation will get faster too!  Each extent is represented
-    as a byte_run object"""
+    Each extent is represented as a byte_run object.  Stored runs never
+    overlap, so the database keeps them sorted by image offset, with
+    parallel sorted lists of their start and end offsets; overlap,
+    coverage and gap queries are binary searches rather than scans of
+    every stored run."""
     def __init__(self,sectorsize=512):
-        self.db = []                    # the database of runs
-        self.sectorsize = 512
-        pass
+        self.db = []                    # the database of runs, sorted by img_offset
+        self.starts = []                # img_offset of each run in self.db
+        self.ends = []                  # img_offset+len of each run in self.db
+        self.sectorsize = sectorsize
+        self._cumlen = None             # running totals of run lengths; rebuilt when needed
     
     def report(self,f):
         """Print information about the database"""
         f.write("sectorsize: %d\n" % self.sectorsize)
-        for run in sorted(self.db):
+        for run in self.db:
             f.write("   [@%8d ; %8d]\n" % (run.img_offset,run.len))
-        f.write("total entries in database: %d\n\n" % len(r))
+        f.write("total entries in database: %d\n\n" % len(self.db))
     
     def sectors_for_bytes(self,count):
         """Returns the number of sectors necessary to hold COUNT bytes"""
         return (count+self.sectorsize-1)//self.sectorsize
     
     def sectors_for_run(self,run):
-        """Returns an array of the sectors for a given run"""
-        start_sector = run.img_offset/self.sectorsize
+        """Returns a range of the sectors for a given run"""
+        start_sector = run.img_offset//self.sectorsize
         sector_count = self.sectors_for_bytes(run.len)
-        return list(range(start_sector,start_sector+sector_count))
+        return range(start_sector,start_sector+sector_count)
 
     def run_for_sector(self,sector_number,count=1):
         """Returns the run for a specified sector, and optionally a count of sectors"""
         return byte_run(len=count*self.sectorsize,img_offset=sector_number * self.sectorsize)
 
+    def _overlapping(self,start,stop):
+        """Returns (i,j) such that self.db[i:j] are the runs overlapping [start,stop)"""
+        i = bisect.bisect_right(self.ends,start)
+        j = bisect.bisect_left(self.starts,stop)
+        return (i,max(i,j))
+
     def intersects(self,extent):
         """Returns the intersecting extent, or None if there is none"""
         if extent.len==0: return True    # 0 length intersects with everything
         if extent.len<0: raise ValueError("Length cannot be negative:"+str(extent))
         start = extent.img_offset
-        stop  = extent.img_offset+extent.len
-        for d in self.db:
-            if d.img_offset <= start < d.img_offset+d.len: return d
-            if d.img_offset < stop  < d.img_offset+d.len: return d
-            if start<d.img_offset and d.img_offset+d.len <= stop: return d
+        i = bisect.bisect_right(self.ends,start)  # first run ending after start
+        if i < len(self.starts) and self.starts[i] < start+extent.len:
+            return self.db[i]
         return None
 
     def intersects_runs(self,runs):
@@ -1420,12 +1559,72 @@ class extentdb:
         v = self.intersects(extent)
         if v:
             raise ValueError("Cannot add "+str(extent)+": it intersects "+str(v))
-        self.db.append(extent)
+        i = bisect.bisect_left(self.starts,extent.img_offset)
+        self.db.insert(i,extent)
+        self.starts.insert(i,extent.img_offset)
+        self.ends.insert(i,extent.img_offset+extent.len)
+        self._cumlen = None
 
     def add_runs(self,runs):
-        """Adds all of the runs to the extent database"""
+        """Adds all of the runs to the extent database.  The runs are sorted
+        and checked against each other and the database, then merged in a
+        single pass, so loading many runs doesn't cost a list insertion each.
+        Raises ValueError, without adding any of the runs, if there is an
+        intersection."""
+        runs = sorted(runs,key=lambda r: r.img_offset)
+        last = None
         for r in runs:
-            self.add(r)
+            v = self.intersects(r)
+            if not v and last is not None and last.img_offset+last.len > r.img_offset:
+                v = last
+            if v:
+                raise ValueError("Cannot add "+str(r)+": it intersects "+str(v))
+            last = r
+        if not runs: return
+        # sorted() is linear on two already-sorted sequences
+        self.db = sorted(self.db+runs,key=lambda r: r.img_offset)
+        self.starts = [r.img_offset for r in self.db]
+        self.ends = [r.img_offset+r.len for r in self.db]
+        self._cumlen = None
+
+    def _running_totals(self):
+        if self._cumlen is None:
+            total = 0
+            self._cumlen = [0]
+            for r in self.db:
+                total += r.len
+                self._cumlen.append(total)
+        return self._cumlen
+
+    def total_len(self):
+        """Returns the number of bytes in the database"""
+        return self._running_totals()[-1]
+
+    def coverage(self,run):
+        """Returns the number of bytes of RUN that are in the database"""
+        if run.len<=0: return 0
+        start = run.img_offset
+        stop  = run.img_offset+run.len
+        (i,j) = self._overlapping(start,stop)
+        if i==j: return 0
+        cumlen = self._running_totals()
+        # whole runs, less the parts of the first and last that fall outside RUN
+        return cumlen[j]-cumlen[i] - max(0,start-self.starts[i]) - max(0,self.ends[j-1]-stop)
+
+    def gaps(self,run):
+        """Returns a list of the runs in RUN that are not in the database"""
+        ret = []
+        if run.len<=0: return ret
+        pos  = run.img_offset
+        stop = run.img_offset+run.len
+        (i,j) = self._overlapping(pos,stop)
+        for k in range(i,j):
+            if self.starts[k] > pos:
+                ret.append(byte_run(img_offset=pos,len=self.starts[k]-pos))
+            pos = max(pos,self.ends[k])
+        if pos < stop:
+            ret.append(byte_run(img_offset=pos,len=stop-pos))
+        return ret
 
     def runs_for_sectors(self,sectors):
         """Given a list of SECTORS, return a list of RUNS.
@@ -1434,13 +1633,38 @@ class extentdb:
         runs = [byte_run(len=self.sectorsize,img_offset=x*self.sectorsize) for x in sectors]
         return combine_runs(runs)
 
+    def runs_for_sector_runs(self,sector_runs):
+        """Given a list of (first sector, sector count) pairs, return a list of RUNS.
+        Automatically combines adjacent runs."""
+        runs = [self.run_for_sector(first,count) for (first,count) in sector_runs if count > 0]
+        return combine_runs(runs)
+
     def add_sectors(self,sectors):
         """Adds the sectors in the list to the database."""
         self.add_runs(self.runs_for_sectors(sectors))
 
+    def add_sector_runs(self,sector_runs):
+        """Adds the (first sector, sector count) pairs in the list to the database."""
+        self.add_runs(self.runs_for_sector_runs(sector_runs))
+
+    def sector_runs_not_in_db(self,run):
+        """For a given run, return a list of (first sector, sector count) pairs
+        for the sectors not in the extent db"""
+        sectors = self.sectors_for_run(run)
+        if len(sectors)==0: return []
+        ret = []
+        for gap in self.gaps(self.run_for_sector(sectors.start,len(sectors))):
+            # only whole sectors are free
+            first = -(-gap.img_offset//self.sectorsize)
+            stop  = (gap.img_offset+gap.len)//self.sectorsize
+            if stop > first:
+                ret.append((first,stop-first))
+        return ret
+
     def sectors_not_in_db(self,run):
         """For a given run, return a list of sectors not in the extent db"""
-        return [x for x in self.sectors_for_run(run) if not self.intersects_sector(x)]
+        return [x for (first,count) in self.sector_runs_not_in_db(run) for x in range(first,first+count)]
+
 
 
 def read_dfxml(xmlfile=None,imagefile=None,flags=0,callback=None,preserve_fis=False):
@@ -1452,6 +1676,17 @@ def read_dfxml(xmlfile=None,imagefile=None,flags=0,callback=None,preserve_fis=Fa
     r.process_xml_stream(xmlfile,callback,preserve_fis)
     return r
 
+def read_dfxml_batches(xmlfile,tags,callback,imagefile=None,batch_size=1000,buffer_size=65536):
+    """Processes a DFXML stream using expat, calling a callback with lists of
+    up to BATCH_SIZE file objects.  Only the TAGS listed are read for each
+    file object (see filtered_fileobject_reader).  BUFFER_SIZE sets both
+    the size of reads from XMLFILE and expat's text buffer."""
+    if not callback:
+        raise ValueError("callback must be specified")
+    r = filtered_fileobject_reader(tags,imagefile=imagefile,batch_size=batch_size,buffer_size=buffer_size)
+    r.process_xml_stream(xmlfile,callback)
+    return r
+
 def iter_dfxml(xmlfile, preserve_elements=False, imagefile=None):
     """Returns an interator that yields fileobjects from a DFXML file.
     
@@ -1589,14 +1824,143 @@ def creatorobjects_sax(xmlfile=None,flags=0):
     except FinishedReadingCreator as e:
         pass
     return ret
+
+BENCHMARK_FILEOBJECT = """  <fileobject>
+    <filename>Documents/report-%d.doc</filename>
+    <partition>1</partition>
+    <id>%d</id>
+    <name_type>r</name_type>
+    <filesize>69632</filesize>
+    <alloc>1</alloc>
+    <used>1</used>
+    <inode>%d</inode>
+    <meta_type>1</meta_type>
+    <mode>511</mode>
+    <nlink>1</nlink>
+    <uid>0</uid>
+    <gid>0</gid>
+    <mtime>2009-11-12T18:31:39Z</mtime>
+    <ctime>2009-11-12T18:31:39Z</ctime>
+    <atime>2009-11-16T05:00:00Z</atime>
+    <crtime>2009-11-12T18:31:37Z</crtime>
+    <byte_runs>
+      <byte_run file_offset="0" fs_offset="%d" img_offset="%d" len="65536"/>
+      <byte_run file_offset="65536" fs_offset="%d" img_offset="%d" len="4096"/>
+    </byte_runs>
+    <hashdigest type="md5">7d1c0dbe9d9e6e5ad1a5b8b1a70a9e5c</hashdigest>
+  </fileobject>
+"""
+
+def benchmark_fileobject(i):
+    """Returns the XML of the I'th fileobject in a synthetic fiwalk-style DFXML file (a 68KiB file with timestamps and two data byte runs)"""
+    offset = 1048576 + i*69632
+    return BENCHMARK_FILEOBJECT % (i, i, 1000+i, offset, offset+32256, offset+65536, offset+97792)
+
+def write_benchmark_dfxml(path,count):
+    """Writes a synthetic fiwalk-style DFXML file with COUNT fileobjects, for benchmarks"""
+    with open(path,"w") as f:
+        f.write("<?xml version='1.0' encoding='UTF-8'?>\n<dfxml version='1.0'>\n<volume offset='32256'>\n")
+        for i in range(count):
+            f.write(benchmark_fileobject(i))
+        f.write("</volume>\n</dfxml>\n")
         
 ################################################################
 if __name__=="__main__":
     from optparse import OptionParser
     parser = OptionParser()
     parser.add_option("-r","--regress",action="store_true")
+    parser.add_option("--benchmark",help="compare DFXML readers on synthetic files with these numbers of fileobjects (comma-separated, e.g. 10000,100000,1000000)")
     (options,args) = parser.parse_args()
 
+    def benchmark_readers(count,tags=("filename","name_type","mtime","crtime","md5")):
+        """Times each reader over a synthetic DFXML file, reading TAGS from every fileobject"""
+        import tempfile
+        import time
+        import Objects
+        (fd,path) = tempfile.mkstemp(suffix=".xml")
+        os.close(fd)
+        results = []
+        try:
+            write_benchmark_dfxml(path,count)
+
+            def run_objects():
+                n = 0
+                for (event,obj) in Objects.iterparse(path):
+                    if isinstance(obj,Objects.FileObject):
+                        n += 1
+                return n
+
+            def run_lxml():
+                from lxml import etree
+                n = 0
+                for (event,element) in etree.iterparse(path,events=("end",),tag="fileobject"):
+                    values = dict((child.tag,child.text) for child in element)
+                    n += 1
+                    element.clear()
+                    while element.getprevious() is not None:
+                        del element.getparent()[0]
+                return n
+
+            def run_sax():
+                counts = []
+                with open(path,"rb") as f:
+                    read_dfxml(xmlfile=f,callback=lambda fi:counts.append(fi.tag("filename")))
+                return len(counts)
+
+            def run_batches():
+                counts = [0]
+                def callback(batch):
+                    for fi in batch:
+                        fi.tag("filename")
+                    counts[0] += len(batch)
+                with open(path,"rb") as f:
+                    read_dfxml_batches(f,tags,callback)
+                return counts[0]
+
+            for (name,reader) in [("Objects.iterparse",run_objects),("lxml iterparse",run_lxml),("fileobject_reader",run_sax),("read_dfxml_batches",run_batches)]:
+                start = time.time()
+                try:
+                    n = reader()
+                except ImportError:
+                    continue
+                assert n==count
+                results.append((name,time.time()-start))
+        finally:
+            os.remove(path)
+        return results
+
+    def benchmark_timestamps(count,distinct=5000):
+        """Times conversion of COUNT fiwalk-style timestamp strings, drawn from
+        DISTINCT values 2 seconds apart, to datetimes and Unix timestamps"""
+        import time
+        base = time.mktime((2009,11,12,18,31,38,0,0,-1))
+        values = [timestamp2iso8601(base + 2*(i % distinct)) for i in range(count)]
+        results = []
+
+        start = time.time()
+        for v in values:
+            time.mktime(iso8601Tdatetime_regex(v).timetuple())
+        results.append(("regex",time.time()-start))
+
+        iso8601Tdatetime.cache_clear()
+        iso8601Tmktime.cache_clear()
+        start = time.time()
+        for v in values:
+            time.mktime(iso8601Tdatetime.__wrapped__(v).timetuple())
+        results.append(("slicing",time.time()-start))
+
+        start = time.time()
+        for v in values:
+            iso8601Tdatetime(v)
+            iso8601Tmktime(v)
+        results.append(("slicing+cache",time.time()-start))
+
+        start = time.time()
+        for v in values:
+            dftime(v).timestamp()
+        results.append(("dftime",time.time()-start))
+        return results
+
     def check_equal(a,b,want=None):
         da = dftime(a)
         db = dftime(b)
@@ -1680,9 +2044,65 @@ if __name__=="__main__":
         assert db.intersects(byte_run(-1,11))
         assert db.intersects(byte_run(-1,1))==None
         assert db.intersects(byte_run(10,1))==None
+        db = extentdb(sectorsize=10)
+        db.add_runs([byte_run(50,20),byte_run(0,10),byte_run(100,5)])
+        db.add(byte_run(30,10))
+        assert [r.img_offset for r in db.db]==[0,30,50,100]
+        assert db.total_len()==45
+        assert db.coverage(byte_run(0,200))==45
+        assert db.coverage(byte_run(5,50))==20
+        assert db.coverage(byte_run(10,20))==0
+        assert [(r.img_offset,r.len) for r in db.gaps(byte_run(5,100))]==[(10,20),(40,10),(70,30)]
+        assert db.sectors_for_run(byte_run(20,25))==range(2,5)
+        assert db.sector_runs_not_in_db(byte_run(0,120))==[(1,2),(4,1),(7,3),(11,1)]
+        assert db.sectors_not_in_db(byte_run(0,120))==[x for x in range(12) if not db.intersects_sector(x)]
+        try:
+            db.add_runs([byte_run(200,10),byte_run(205,10)])
+            assert False
+        except ValueError:
+            assert db.intersects(byte_run(200,1))==None
+        db.add_sector_runs([(20,2),(22,1)])
+        assert db.intersects(byte_run(229,1)) and db.intersects(byte_run(230,1))==None
         print("Overlap engine good!")
         assert re.sub(rx_xmlns, "", """<fileobject xmlns="http://www.forensicswiki.org/wiki/Category:Digital_Forensics_XML">""") == "<fileobject>"
         assert re.sub(rx_xmlns, "", """<fileobject xmlns:dfxml="http://www.forensicswiki.org/wiki/Category:Digital_Forensics_XML">""") == "<fileobject>"
         assert re.sub(rx_xmlns, "", """<fileobject delta:new_file="1">""") == """<fileobject delta:new_file="1">"""
         assert re.sub(rx_xmlns, "", """<fileobject xmlns="http://www.forensicswiki.org/wiki/Category:Digital_Forensics_XML" attr="1">""") == """<fileobject attr="1">"""
-        print("XML namespace regex good!")
\ No newline at end of file
+        print("XML namespace regex good!")
+        print("Testing filtered SAX reader:")
+        import io
+        test_dfxml = b"""<dfxml><volume><fileobject><filename>a.txt</filename><filesize>3</filesize><mtime>2009-01-23T01:23:45Z</mtime><byte_runs><byte_run img_offset="512" len="3"/></byte_runs><hashdigest type="md5">abc</hashdigest><hashdigest type="sha1">def</hashdigest><original_fileobject><filename>old.txt</filename></original_fileobject></fileobject><fileobject><filename>b</filename></fileobject><fileobject><filename>c</filename></fileobject></volume></dfxml>"""
+        batches = []
+        read_dfxml_batches(io.BytesIO(test_dfxml),["filename","md5","byte_runs"],batches.append,batch_size=2,buffer_size=16)
+        assert [len(batch) for batch in batches]==[2,1]
+        fi = batches[0][0]
+        assert fi.filename()=="a.txt" and fi.tag("mtime") is None and fi.tag("filesize") is None
+        assert fi.hashdigest=={"md5":"abc"} and fi.md5()=="abc"
+        assert [(r.img_offset,r.len) for r in fi.byte_runs()]==[(512,3)]
+        assert [batch[i].filename() for batch in batches for i in range(len(batch))]==["a.txt","b","c"]
+        print("Filtered SAX reader good!")
+        print("Testing ISO8601 parsing:")
+        import time
+        for s in ["2009-01-23T01:23:45Z","2009-01-23 01:23:45Z","2009-01-23T01:23:45","2009-01-23T01:23:45.25Z","2009-01-23T01:23:45+0130","x2009-01-23T01:23:45Z"]:
+            assert iso8601Tdatetime(s)==iso8601Tdatetime_regex(s),s
+            assert iso8601Tdatetime(s) is iso8601Tdatetime(s)
+        for s in ["2009-13-23T01:23:45Z","2009-01-23T01:23:4xZ","2009-01-23T01:23:4x"]:
+            try:
+                iso8601Tdatetime(s)
+                assert False,s
+            except ValueError:
+                pass
+        assert dftime("2009-01-23T01:23:45Z").timestamp()==time.mktime(iso8601Tdatetime_regex("2009-01-23T01:23:45Z").timetuple())
+        assert gmtmin(90) is iso8601Tdatetime("2009-01-23T01:23:45+0130").tzinfo
+        print("ISO8601 parsing good!")
+
+    if options.benchmark:
+        for count in [int(x) for x in options.benchmark.split(",")]:
+            results = benchmark_readers(count)
+            print("%d fileobjects:" % count)
+            for (name,elapsed) in results:
+                print("    %-20s %8.2fs  %10.0f fileobjects/s" % (name,elapsed,count/elapsed))
+            results = benchmark_timestamps(count)
+            print("%d timestamps:" % count)
+            for (name,elapsed) in results:
+                print("    %-20s %8.2fs  %10.0f timestamps/s" % (name,elapsed,count/elapsed))
\ No newline at end of file